@@ -1,4 +1,6 @@
-from flask import Flask, request, jsonify
+from queue import Full
+
+from flask import Flask, request, jsonify, make_response
 from flask_apispec.extension import FlaskApiSpec
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
@@ -48,10 +50,45 @@ def create_app():
 
 def init_bot(app):
     from bot import charity_bot
+    from bot import outbox
+    from app.webhooks import job_worker
+    from app.logger import bot_logger
+    from bot.update_metrics import update_queue_metrics
+    from core.services import statistics_service
     dispatcher = charity_bot.init()
+    dispatcher.job_queue.run_repeating(outbox.process_outbox,
+                                       interval=config.OUTBOX_POLL_INTERVAL,
+                                       first=0,
+                                       name='Notifications outbox')
+    dispatcher.job_queue.run_repeating(job_worker.process_webhook_jobs,
+                                       interval=config.WEBHOOK_JOBS_POLL_INTERVAL,
+                                       first=0,
+                                       name='Webhook jobs')
+    dispatcher.job_queue.run_repeating(statistics_service.refresh_statistics_rollups,
+                                       interval=config.STATISTICS_ROLLUP_INTERVAL,
+                                       first=0,
+                                       name='Statistics rollups')
+    dispatcher.job_queue.run_repeating(statistics_service.maintain_statistics_partitions,
+                                       interval=config.STATISTICS_PARTITIONS_INTERVAL,
+                                       first=0,
+                                       name='Statistics partitions')
 
     @app.post(f'/api/{TELEGRAM_TOKEN}/telegramWebhook')
     def webhook():
-        update = Update.de_json(request.json, dispatcher.bot)
-        dispatcher.process_update(update)
-        return jsonify({})
\ No newline at end of file
+        data = request.get_json(silent=True)
+        try:
+            update = Update.de_json(data, dispatcher.bot) if isinstance(data, dict) else None
+        except (AttributeError, KeyError, TypeError, ValueError):
+            update = None
+        if update is None:
+            bot_logger.warning('Webhook: Request body is not a Telegram update')
+            return make_response(jsonify(message='Bad request'), 400)
+        update_queue_metrics.on_enqueued(update)
+        try:
+            # The dispatcher thread handles the update, Telegram gets the answer at once
+            dispatcher.update_queue.put_nowait(update)
+        except Full:
+            update_queue_metrics.on_rejected(update)
+            bot_logger.warning(f'Webhook: Update queue is full, update {update.update_id} rejected')
+            return make_response(jsonify(message='Update queue is full'), 503)
+        return jsonify({})
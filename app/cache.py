@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from typing import Any, Optional
+
+from app import config
+from app.logger import app_logger as logger
+
+
+class SqliteCache:
+    """
+    JSON values cache in a local sqlite file, shared by all worker processes
+    on the host. Entries expire after their TTL (None keeps an entry until it
+    is invalidated or evicted); when there are more than `max_entries`
+    entries, the least recently read ones are evicted. A read refreshes the
+    access time at most once per ACCESS_RESOLUTION seconds, so hot keys don't
+    write on every request. Hit and miss counters are kept by every process.
+    Cache errors are logged and treated as misses.
+    """
+
+    ACCESS_RESOLUTION = 1  # seconds
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._metrics = Counter()
+        self._metrics_lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        try:
+            connection = self._connect()
+            row = connection.execute(
+                'SELECT value, accessed_at FROM cache_entries '
+                'WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, now)
+            ).fetchone()
+            if row and now - row[1] >= self.ACCESS_RESOLUTION:
+                with connection:
+                    connection.execute('UPDATE cache_entries SET accessed_at = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as ex:
+            logger.error(f'Cache: Read error "{str(ex)}"')
+            return None
+        self._count('hits' if row else 'misses')
+        return json.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[int]) -> None:
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO cache_entries (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                    (key, json.dumps(value), now + ttl if ttl is not None else None, now)
+                )
+                evicted = connection.execute(
+                    'DELETE FROM cache_entries WHERE expires_at <= ? OR key IN '
+                    '(SELECT key FROM cache_entries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                    (now, self.max_entries)
+                ).rowcount
+        except sqlite3.Error as ex:
+            logger.error(f'Cache: Write error "{str(ex)}"')
+            return
+        self._count('evictions', evicted)
+
+    def invalidate(self, *prefixes: str) -> None:
+        """Removes the entries whose keys start with any of the prefixes."""
+        try:
+            with self._connect() as connection:
+                # A key range instead of LIKE, so the primary key index is used
+                removed = sum(connection.execute(
+                    'DELETE FROM cache_entries WHERE key >= ? AND key < ?',
+                    (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+                ).rowcount for prefix in prefixes)
+        except sqlite3.Error as ex:
+            logger.error(f'Cache: Invalidation error "{str(ex)}"')
+            return
+        self._count('invalidations', removed)
+
+    def get_metrics(self) -> dict:
+        """Entries in the file and the hit, miss, eviction and invalidation counters of this process."""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        try:
+            metrics['entries'] = self._connect().execute('SELECT count(*) FROM cache_entries').fetchone()[0]
+        except sqlite3.Error as ex:
+            logger.error(f'Cache: Metrics error "{str(ex)}"')
+            return {}
+        requests = metrics.get('hits', 0) + metrics.get('misses', 0)
+        metrics['hit_ratio'] = round(metrics.get('hits', 0) / requests, 3) if requests else None
+        return metrics
+
+    def _count(self, name: str, value: int = 1) -> None:
+        if value:
+            with self._metrics_lock:
+                self._metrics[name] += value
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            columns = [column[1] for column in connection.execute('PRAGMA table_info(cache_entries)')]
+            if columns and 'accessed_at' not in columns:
+                # A file of the previous layout, its entries are simply dropped
+                connection.execute('DROP TABLE cache_entries')
+            connection.execute('CREATE TABLE IF NOT EXISTS cache_entries '
+                               '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS ix_cache_entries_accessed_at ON cache_entries (accessed_at)')
+            connection.commit()
+            self._local.connection = connection
+        return connection
+
+
+ANALYTICS_CACHE_PREFIX = 'analytics:'
+ANALYTICS_SERIES_PREFIX = f'{ANALYTICS_CACHE_PREFIX}series:'
+
+analytics_cache = SqliteCache(config.ANALYTICS_CACHE_PATH, config.ANALYTICS_CACHE_SIZE)
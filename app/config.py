@@ -57,15 +57,68 @@ PARAM_HEADER_AUTH = {
 # ------------------------------
 # Pagination
 PAGE_LIMIT = 10
+MAX_PAGE_LIMIT = 100
 # ------------------------------
 # Telegram bot settings
 TELEGRAM_TOKEN = os.getenv('TOKEN')
 WEBHOOK_URL = f'{HOST_NAME}/api/{TELEGRAM_TOKEN}/telegramWebhook'
 USE_WEBHOOK = os.getenv('USE_WEBHOOK')
-MAILING_BATCH_SIZE = 5
-
+# Mailing settings. Telegram allows about 30 messages per second
+# for a bot and about one message per second to the same chat.
+MAILING_RATE_LIMIT = 25  # messages per second
+MAILING_CHAT_INTERVAL = 1  # seconds
+MAILING_WORKERS = 8
+MAILING_TRIES = 3
+# Webhook updates are queued and handled one at a time by the dispatcher thread
+UPDATE_QUEUE_SIZE = 1000
+# Connections for the mailing senders, the dispatcher, the job queue and the outbox
+BOT_CON_POOL_SIZE = MAILING_WORKERS + 4
+# Notifications outbox worker
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 5  # seconds
+OUTBOX_CLAIM_TIMEOUT = 600  # seconds
+OUTBOX_MAX_ATTEMPTS = 3
+# Task notifications: recipients are streamed in chunks, several tasks
+# for one user can be merged into a single digest message
+TASK_NOTIFICATION_CHUNK_SIZE = 1000
+TASK_NOTIFICATION_DIGEST = False
+# Number of tasks written by one INSERT ... ON CONFLICT statement
+TASKS_UPSERT_CHUNK_SIZE = 1000
+# Tasks and categories webhooks are processed in the background
+WEBHOOK_JOBS_DIR = os.path.join(BASE_DIR, 'webhook_jobs')
+WEBHOOK_JOBS_POLL_INTERVAL = 1  # seconds
+WEBHOOK_JOBS_TIMEOUT = 600  # seconds
+WEBHOOK_JOBS_MAX_ATTEMPTS = 3
+# How often a process checks that its in-memory category tree is up to date
+CATEGORY_TREE_CHECK_INTERVAL = 5  # seconds
+# Rendered task messages kept in memory for notifications and the open tasks feed
+TASK_MESSAGE_CACHE_SIZE = 10000
+# Command statistics are buffered and written in batches by a background thread
+STATISTICS_BATCH_SIZE = 500
+STATISTICS_FLUSH_INTERVAL = 1000  # milliseconds
+STATISTICS_BUFFER_SIZE = 50000
+# Daily analytics rollups: days before yesterday are final, recent days are recomputed
+STATISTICS_ROLLUP_INTERVAL = 300  # seconds
+STATISTICS_ROLLUP_DAYS = 1
+# Statistics is partitioned by month: partitions are created ahead of time,
+# partitions older than the retention window are dropped
+STATISTICS_PARTITIONS_INTERVAL = 6 * 60 * 60  # seconds
+STATISTICS_PARTITIONS_AHEAD = 6  # months
+STATISTICS_RETENTION_MONTHS = int(os.getenv('STATISTICS_RETENTION_MONTHS', 12))
+# Analytics responses cache, shared by the workers through a sqlite file
+ANALYTICS_CACHE_PATH = os.path.join(BASE_DIR, 'cache', 'analytics.sqlite3')
+ANALYTICS_CACHE_SIZE = 256
+ANALYTICS_CACHE_TTL = 60  # seconds
+# Days in the series of the analytics dashboard
+ANALYTICS_SERIES_DAYS = 30
+# Rows fetched from the server side cursor at once by the export endpoints
+EXPORT_BATCH_SIZE = 1000
+
+# Bot persistence is kept in the bot_persistence table, the pickle file
+# of the previous versions is imported once into an empty table
 BOT_FILE_DIR = BASE_DIR + '/bot_persistence_file/'
 BOT_PERSISTENCE_FILE = os.path.join(BOT_FILE_DIR, 'bot_persistence_data')
+BOT_PERSISTENCE_FLUSH_INTERVAL = 10  # seconds
 
 APISPEC_SPEC = {
     'APISPEC_SPEC':
@@ -10,13 +10,20 @@ from . import send_tg_notification
 from . import send_tg_message_to_user
 from . import users
 from . import download_log_files
+from . import export
 
 front_api.add_resource(analytics.Analytics, '/api/v1/analytics/')
 front_api.add_resource(send_tg_notification.SendTelegramNotification,
                        '/api/v1/messages/')
+front_api.add_resource(send_tg_notification.NotificationProgress,
+                       '/api/v1/notifications/<int:notification_id>/')
 front_api.add_resource(send_tg_message_to_user.SendTelegramMessage,
                        '/api/v1/messages/<int:telegram_id>/')
 front_api.add_resource(users.UsersList, '/api/v1/users/')
+front_api.add_resource(users.UsersCursorList, '/api/v1/users/cursor/')
+front_api.add_resource(users.UsersSearch, '/api/v1/users/search/')
 front_api.add_resource(users.UserItem, '/api/v1/users/<int:telegram_id>/')
 front_api.add_resource(download_log_files.DownloadLogs, '/api/v1/download_logs/')
 front_api.add_resource(download_log_files.GetListLogFiles, '/api/v1/logs/')
+front_api.add_resource(export.UsersExport, '/api/v1/export/users/')
+front_api.add_resource(export.StatisticsExport, '/api/v1/export/statistics/')
@@ -7,16 +7,16 @@ from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from sqlalchemy import distinct
 from sqlalchemy.sql import func
-from sqlalchemy.sql.schema import Column
-from sqlalchemy.sql.sqltypes import Boolean
 
 from app import config
+from app.cache import ANALYTICS_CACHE_PREFIX, ANALYTICS_SERIES_PREFIX, analytics_cache
 from app.webhooks import health_check
 from app.database import db_session
-from app.models import ReasonCanceling, Statistics, User
+from app.models import DailyActiveUser, DailyCommandStats, DailyUserStats, ReasonCanceling, User
 from bot.constants import constants
 
-DAYS_NUMBER = 30
+DAYS_NUMBER = config.ANALYTICS_SERIES_DAYS
+CACHE_TOTALS_KEY = f'{ANALYTICS_CACHE_PREFIX}totals'
 
 
 class Analytics(MethodResource, Resource):
@@ -33,46 +33,60 @@ class Analytics(MethodResource, Resource):
     def get(self):
         date = request.args.get('date_limit', datetime.now().date().__str__())
         date_limit = datetime.strptime(date, '%Y-%m-%d').date()
-        date_begin = date_limit - timedelta(days=DAYS_NUMBER)
+        return make_response(jsonify(**get_totals_statistic(), **get_series_statistic(date_limit)), 200)
+
+
+def get_totals_statistic():
+    """Current state numbers, cached for ANALYTICS_CACHE_TTL seconds."""
+    result = analytics_cache.get(CACHE_TOTALS_KEY)
+    if result is None:
         reasons_canceling_from_db = get_reason_cancelling_statistics()
         reasons_canceling = {
             constants.REASONS.get(key, 'Другое'):
                 value for key, value in reasons_canceling_from_db
         }
-        return make_response(jsonify(command_stats=dict(get_statistics(Statistics.command)),
-                                     reasons_canceling=reasons_canceling,
-                                     number_users=get_number_users_statistic(),
-                                     all_users_statistic=dict(
-                                         added_users=get_statistics_by_days(date_begin, User.date_registration),
-                                         added_external_users=get_statistics_by_days(date_begin,
-                                                                                     User.external_signup_date),
-                                         users_unsubscribed=get_statistics_by_days(date_begin,
-                                                                                   ReasonCanceling.added_date)),
-                                     active_users_statistic=users_activity_statistic(date_begin, Statistics.added_date,
-                                                                                     Statistics.telegram_id),
-                                     tasks=dict(last_update=health_check.get_last_update(),
-                                                active_tasks=health_check.get_count_active_tasks())), 200)
+        result = dict(command_stats=dict(get_command_statistics()),
+                      reasons_canceling=reasons_canceling,
+                      number_users=get_number_users_statistic(),
+                      tasks=dict(last_update=health_check.get_last_update(),
+                                 active_tasks=health_check.get_count_active_tasks()))
+        analytics_cache.set(CACHE_TOTALS_KEY, result, config.ANALYTICS_CACHE_TTL)
+    return result
 
 
-def get_number_users_statistic():
-    users = db_session.query(User.has_mailing, User.banned).all()
-    number_users = len(users)
-    # user[0] - has_mailing, user[1] - banned
-    subscribed_users = len([user for user in users if user[0] and not user[1]])
-    not_subscribed_users = len([user for user in users if not user[0] and not user[1]])
-    banned_users = len([user for user in users if user[1]])
-    return {
-        'all_users': number_users,
-        'subscribed_users': subscribed_users,
-        'not_subscribed_users': not_subscribed_users,
-        'banned_users': banned_users,
-    }
+def get_series_statistic(date_limit):
+    """
+    Statistics by days until date_limit. Days before the rollups refresh
+    window only change through StatisticsService, which invalidates the
+    series containing them, so series which end before it are cached without TTL.
+    """
+    key = f'{ANALYTICS_SERIES_PREFIX}{date_limit}'
+    result = analytics_cache.get(key)
+    if result is None:
+        date_begin = date_limit - timedelta(days=DAYS_NUMBER)
+        result = dict(all_users_statistic=get_users_statistic_by_days(date_begin, date_limit),
+                      active_users_statistic=users_activity_statistic(date_begin, date_limit))
+        is_final = date_limit < datetime.now().date() - timedelta(days=config.STATISTICS_ROLLUP_DAYS)
+        analytics_cache.set(key, result, None if is_final else config.ANALYTICS_CACHE_TTL)
+    return result
 
 
-def get_statistics(column_name: Column) -> list:
+def get_number_users_statistic():
+    users = db_session.query(
+        func.count(User.telegram_id).label('all_users'),
+        func.count(User.telegram_id).filter(User.has_mailing.is_(True), User.banned.is_(False))
+        .label('subscribed_users'),
+        func.count(User.telegram_id).filter(User.has_mailing.is_not(True), User.banned.is_(False))
+        .label('not_subscribed_users'),
+        func.count(User.telegram_id).filter(User.banned.is_(True)).label('banned_users'),
+    ).one()
+    return dict(users._mapping)
+
+
+def get_command_statistics() -> list:
     result = db_session.query(
-        column_name, func.count(column_name)
-    ).group_by(column_name).all()
+        DailyCommandStats.command, func.sum(DailyCommandStats.count)
+    ).group_by(DailyCommandStats.command).all()
     return result
 
 
@@ -83,23 +97,13 @@ def get_reason_cancelling_statistics():
     return result
 
 
-def get_monthly_statistics(date_begin, column_name: Column, second_column_name: Column):
-    result = db_session.query(
-        func.count(distinct(second_column_name))
-    ).filter(column_name > date_begin).all()
-    return result[0][0]
-
-
-def get_statistics_by_days(date_begin, column_name: Column, second_column_name: Column = None) -> dict:
-    column_to_count = column_name if second_column_name is None else distinct(second_column_name)
-    result = dict(
-        db_session.query(
-            func.to_char(column_name, 'YYYY-MM-DD'),
-            func.count(column_to_count))
-            .filter(column_name > date_begin)
-            .group_by(func.to_char(column_name, 'YYYY-MM-DD'))
-            .all())
-    return get_dict_by_days(date_begin, result)
+def get_users_statistic_by_days(date_begin, date_limit) -> dict:
+    days = db_session.query(DailyUserStats).filter(DailyUserStats.day > date_begin,
+                                                   DailyUserStats.day <= date_limit).all()
+    return {
+        name: get_dict_by_days(date_begin, {day.day.strftime('%Y-%m-%d'): getattr(day, name) for day in days})
+        for name in ('added_users', 'added_external_users', 'users_unsubscribed')
+    }
 
 
 def get_dict_by_days(date_begin, result):
@@ -111,35 +115,22 @@ def get_dict_by_days(date_begin, result):
     }
 
 
-def get_statistic_by_days_with_filtration(date_begin, column_name: Column, second_column_name: Column,
-                                          filter_list: list):
-    column_to_count = distinct(second_column_name)
-    result = dict(
-        db_session.query(
-            func.to_char(column_name, 'YYYY-MM-DD'),
-            func.count(column_to_count))
-            .filter(column_name > date_begin)
-            .filter(second_column_name.in_(filter_list))
-            .group_by(func.to_char(column_name, 'YYYY-MM-DD'))
-            .all())
-    return get_dict_by_days(date_begin, result)
-
-
-def users_activity_statistic(date_begin, column_name: Column, second_column_name: Column = None):
-    users = db_session.query(User.telegram_id, User.has_mailing).all()
-    subscribed_users_ids = [user[0] for user in users if user[1] is True]
-    unsubscribed_users_ids = [user[0] for user in users if user[1] is False]
-
-    all_active_users = get_statistics_by_days(date_begin, column_name, second_column_name)
-    subscribed_active_users = get_statistic_by_days_with_filtration(date_begin, column_name, second_column_name,
-                                                                    subscribed_users_ids)
-    unsubscribed_active_users = get_statistic_by_days_with_filtration(date_begin, column_name, second_column_name,
-                                                                      unsubscribed_users_ids)
-    active_users_per_month = get_monthly_statistics(date_begin, column_name, second_column_name)
+def users_activity_statistic(date_begin, date_limit):
+    """Active users per day split by the current subscription state, counted with one query."""
+    days = db_session.query(
+        DailyActiveUser.day,
+        func.count(DailyActiveUser.telegram_id).label('all'),
+        func.count(DailyActiveUser.telegram_id).filter(User.has_mailing.is_(True)).label('subscribed'),
+        func.count(DailyActiveUser.telegram_id).filter(User.has_mailing.is_(False)).label('unsubscribed'),
+    ).outerjoin(User, User.telegram_id == DailyActiveUser.telegram_id)\
+        .filter(DailyActiveUser.day > date_begin, DailyActiveUser.day <= date_limit)\
+        .group_by(DailyActiveUser.day).all()
+    active_users_per_month = db_session.query(
+        func.count(distinct(DailyActiveUser.telegram_id))
+    ).filter(DailyActiveUser.day > date_begin, DailyActiveUser.day <= date_limit).scalar()
     result = {
-        'all': all_active_users,
-        'subscribed': subscribed_active_users,
-        'unsubscribed': unsubscribed_active_users,
-        'active_users_per_month': active_users_per_month
+        name: get_dict_by_days(date_begin, {day.day.strftime('%Y-%m-%d'): getattr(day, name) for day in days})
+        for name in ('all', 'subscribed', 'unsubscribed')
     }
+    result['active_users_per_month'] = active_users_per_month
     return result
@@ -0,0 +1,153 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from flask import Response, jsonify, make_response, request, stream_with_context
+from flask_apispec import doc
+from flask_apispec.views import MethodResource
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+from sqlalchemy import func, select
+
+from app import config
+from app.database import engine
+from app.logger import app_logger as logger
+from app.models import Statistics, User, Users_Categories
+
+FORMATS = ('csv', 'ndjson')
+EXPORT_PARAMS = {
+    'format': {
+        'description': 'csv or ndjson',
+        'in': 'query',
+        'type': 'string',
+        'default': 'csv',
+        'required': False
+    },
+    'gzip': {
+        'description': 'Compress the file with gzip',
+        'in': 'query',
+        'type': 'boolean',
+        'default': False,
+        'required': False
+    },
+    'Authorization': config.PARAM_HEADER_AUTH,
+}
+
+
+class UsersExport(MethodResource, Resource):
+    @doc(description='Export of all users with ids of their categories',
+         tags=['Export'],
+         params=EXPORT_PARAMS)
+    @jwt_required()
+    def get(self):
+        category_ids = select(func.array_agg(Users_Categories.category_id))\
+            .where(Users_Categories.telegram_id == User.telegram_id)\
+            .scalar_subquery()
+        query = select(User.telegram_id,
+                       User.username,
+                       User.email,
+                       User.first_name,
+                       User.last_name,
+                       User.external_id,
+                       User.has_mailing,
+                       User.banned,
+                       User.date_registration,
+                       User.external_signup_date,
+                       category_ids.label('category_ids')).order_by(User.telegram_id)
+        return export_response(query, 'users')
+
+
+class StatisticsExport(MethodResource, Resource):
+    @doc(description='Export of the bot commands statistics for the period',
+         tags=['Export'],
+         params={
+             'date_from': {
+                 'description': 'First day of the period, YYYY-MM-DD',
+                 'in': 'query',
+                 'type': 'date',
+                 'required': True},
+             'date_to': {
+                 'description': 'Last day of the period, YYYY-MM-DD',
+                 'in': 'query',
+                 'type': 'date',
+                 'required': True},
+             **EXPORT_PARAMS})
+    @jwt_required()
+    def get(self):
+        try:
+            date_from = datetime.strptime(request.args.get('date_from', ''), '%Y-%m-%d')
+            date_to = datetime.strptime(request.args.get('date_to', ''), '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            return make_response(jsonify(message='date_from and date_to must be dates in YYYY-MM-DD format'), 400)
+        query = select(Statistics.id,
+                       Statistics.telegram_id,
+                       Statistics.command,
+                       Statistics.added_date)\
+            .where(Statistics.added_date >= date_from, Statistics.added_date < date_to)\
+            .order_by(Statistics.added_date, Statistics.id)
+        return export_response(query, 'statistics')
+
+
+def export_response(query, name):
+    export_format = request.args.get('format', 'csv')
+    if export_format not in FORMATS:
+        return make_response(jsonify(message=f'format must be one of {", ".join(FORMATS)}'), 400)
+    use_gzip = request.args.get('gzip', '').lower() in ('1', 'true')
+
+    chunks = iter_csv(query) if export_format == 'csv' else iter_ndjson(query)
+    mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    filename = f'{name}_{datetime.now().strftime("%Y-%m-%d")}.{export_format}'
+    if use_gzip:
+        chunks = iter_gzip(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    logger.info(f'Export: {name} export in {export_format} started')
+    return Response(stream_with_context(chunks),
+                    mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+def iter_rows(query):
+    """
+    Yields the query rows in batches of EXPORT_BATCH_SIZE through a server side
+    cursor, so only one batch is kept in memory. The export runs in a gthread
+    worker thread, the worker keeps reporting to gunicorn however long it takes.
+    """
+    with engine.connect() as connection:
+        result = connection.execution_options(stream_results=True).execute(query)
+        yield result.keys()
+        for rows in result.partitions(config.EXPORT_BATCH_SIZE):
+            yield rows
+
+
+def iter_csv(query):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    batches = iter_rows(query)
+    writer.writerow(next(batches))
+    for rows in batches:
+        writer.writerows(
+            [' '.join(map(str, value)) if isinstance(value, list) else value for value in row] for row in rows
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_ndjson(query):
+    batches = iter_rows(query)
+    keys = list(next(batches))
+    for rows in batches:
+        yield ''.join(json.dumps(dict(zip(keys, row)), ensure_ascii=False, default=str) + '\n' for row in rows)
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
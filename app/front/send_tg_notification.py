@@ -1,5 +1,3 @@
-import datetime
-
 from flask import jsonify, make_response
 from flask_apispec import doc, use_kwargs
 from flask_apispec.views import MethodResource
@@ -77,10 +75,11 @@ class SendTelegramNotification(Resource, MethodResource):
         message = Notification(message=message, sent_by=authorized_user)
         db_session.add(message)
         try:
-            db_session.commit()
+            db_session.flush()
             job_queue = TelegramNotification(mode)
 
-            if not job_queue.send_notification(message=message.message):
+            if not job_queue.send_notification(notification=message):
+                db_session.rollback()
                 logger.info(
                     'Messages: Passed invalid <mode> parameter. '
                     f'Passed: {mode}'
@@ -93,8 +92,6 @@ class SendTelegramNotification(Resource, MethodResource):
                     400
                 )
 
-            message.was_sent = True
-            message.sent_date = datetime.datetime.now()
             db_session.commit()
 
         except SQLAlchemyError as ex:
@@ -108,7 +105,38 @@ class SendTelegramNotification(Resource, MethodResource):
                     f'has been successfully added to the mailing list.')
         return make_response(
             jsonify(
-                result='Сообщение успешно добавлено в очередь рассылки.'
+                result='Сообщение успешно добавлено в очередь рассылки.',
+                notification_id=message.id
+            ),
+            200
+        )
+
+
+class NotificationProgress(Resource, MethodResource):
+
+    @doc(description='Delivery progress of the notification sent to the Telegram chats.',
+         summary='Notification delivery progress',
+         tags=['Messages'],
+         responses={
+             200: {'description': 'Delivery counters of the notification'},
+             404: {'description': 'The notification is not found'},
+         },
+         params={'Authorization': config.PARAM_HEADER_AUTH}
+         )
+    @jwt_required()
+    def get(self, notification_id):
+        notification = Notification.query.get(notification_id)
+        if not notification:
+            logger.info(f'Messages: The notification {notification_id} not found.')
+            return make_response(jsonify(message='Уведомление не найдено.'), 404)
+        return make_response(
+            jsonify(
+                id=notification.id,
+                was_sent=notification.was_sent,
+                sent_date=notification.sent_date,
+                queued=notification.queued_count,
+                sent=notification.sent_count,
+                failed=notification.failed_count
             ),
             200
         )
@@ -1,3 +1,27 @@
+USERS_CURSOR_SCHEMA = {
+    "200": {'description': 'ok',
+            "examples": {
+                'RESULT': {
+                    "total_estimate": 1000,
+                    "next_cursor": "WyIyMDIxLTA2LTI2VDE4OjI5OjQxIiwgMTIzNDU2Nzg5XQ",
+                    "next_url": "/api/v1/users/cursor/?cursor=WyIyMDIxLTA2LTI2VDE4OjI5OjQxIiwgMTIzNDU2Nzg5XQ&limit=10",
+                    "result":
+                        [
+                            {"username": 'username',
+                             "email": 'email@example.com',
+                             "first_name": "First Name",
+                             "last_name": "Last Name",
+                             "telegram_id": 000000000,
+                             "has_mailing": 'true',
+                             "date_registration": "2021-06-26"
+                             }
+                        ]
+                }
+            }
+            },
+    "400": {'description': 'Invalid cursor'}
+}
+
 USERS_SCHEMA = {
     "200": {'description': 'ok',
             "examples": {
@@ -1,3 +1,9 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from urllib.parse import urlencode
+
 from email_validator import validate_email, EmailNotValidError
 from flask import jsonify, make_response, request
 from flask_apispec import doc, use_kwargs
@@ -5,6 +11,7 @@ from flask_apispec.views import MethodResource
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import fields
+from sqlalchemy import text, tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy_pagination import paginate
 
@@ -12,10 +19,14 @@ from app import config
 from app import formatter
 from app.database import db_session
 from app.logger import app_logger as logger
-from .swagger_schemas import USERS_SCHEMA
+from .swagger_schemas import USERS_CURSOR_SCHEMA, USERS_SCHEMA
 from app.models import User
+from core.services.user_search_service import user_search_service
 from . import front_api as api
 
+# Maximum of an integer column, like categories.id
+INTEGER_MAX = 2 ** 31 - 1
+
 
 USER_SCHEMA = {
     'username': fields.Str(),
@@ -85,6 +96,187 @@ class UsersList(MethodResource, Resource):
         )
 
 
+class UsersCursorList(MethodResource, Resource):
+    """Users list with keyset pagination, the page cost does not depend on its depth"""
+
+    @doc(description='List of all users, newest first. Pass next_cursor of the response to get the next page',
+         tags=['Users Control'],
+         params={'cursor': {
+             'description': 'Cursor from the previous page, omit for the first page',
+             'in': 'query',
+             'type': 'string',
+             'required': False
+         },
+             'limit': {
+                 'description': 'Limit of items on one page, from 1 to 100',
+                 'in': 'query',
+                 'type': 'integer',
+                 'default': 10,
+                 'required': False
+             },
+             'with_total': {
+                 'description': 'Add the estimated number of users',
+                 'in': 'query',
+                 'type': 'boolean',
+                 'default': False,
+                 'required': False
+             },
+             'Authorization': config.PARAM_HEADER_AUTH,
+         },
+         responses=USERS_CURSOR_SCHEMA
+         )
+    @jwt_required()
+    def get(self):
+        limit = parse_limit(request.args.get('limit'))
+        if limit is None:
+            return make_response(jsonify(message=f'limit must be an integer from 1 to {config.MAX_PAGE_LIMIT}'), 400)
+        try:
+            result = get_cursor_page(db_session.query(User), UsersCursorList, limit)
+        except ValueError:
+            logger.info(f'Users: Invalid cursor {request.args.get("cursor")}')
+            return make_response(jsonify(message='Invalid cursor'), 400)
+        if parse_bool(request.args.get('with_total')):
+            result['total_estimate'] = get_users_count_estimate()
+        return make_response(jsonify(result), 200)
+
+
+class UsersSearch(MethodResource, Resource):
+    """Users search by name, username or email with exact filters, paginated as UsersCursorList"""
+
+    @doc(description='Search users. All the given filters are combined, the result is newest first',
+         tags=['Users Control'],
+         params={'q': {
+             'description': 'Part of username, email, first or last name; telegram_id or external_id',
+             'in': 'query',
+             'type': 'string',
+             'required': False
+         },
+             'has_mailing': {
+                 'description': 'Subscription state',
+                 'in': 'query',
+                 'type': 'boolean',
+                 'required': False
+             },
+             'banned': {
+                 'description': 'Banned state',
+                 'in': 'query',
+                 'type': 'boolean',
+                 'required': False
+             },
+             'category_id': {
+                 'description': 'Users subscribed to the category',
+                 'in': 'query',
+                 'type': 'integer',
+                 'required': False
+             },
+             'cursor': {
+                 'description': 'Cursor from the previous page, omit for the first page',
+                 'in': 'query',
+                 'type': 'string',
+                 'required': False
+             },
+             'limit': {
+                 'description': 'Limit of items on one page, from 1 to 100',
+                 'in': 'query',
+                 'type': 'integer',
+                 'default': 10,
+                 'required': False
+             },
+             'Authorization': config.PARAM_HEADER_AUTH,
+         },
+         responses=USERS_CURSOR_SCHEMA
+         )
+    @jwt_required()
+    def get(self):
+        limit = parse_limit(request.args.get('limit'))
+        if limit is None:
+            return make_response(jsonify(message=f'limit must be an integer from 1 to {config.MAX_PAGE_LIMIT}'), 400)
+        category_id = request.args.get('category_id') or None
+        if category_id is not None:
+            category_id = parse_int(category_id, 0, INTEGER_MAX)
+            if category_id is None:
+                return make_response(jsonify(message=f'category_id must be an integer from 0 to {INTEGER_MAX}'), 400)
+        query = user_search_service.get_query(search=request.args.get('q', '').strip(),
+                                              has_mailing=parse_bool(request.args.get('has_mailing')),
+                                              banned=parse_bool(request.args.get('banned')),
+                                              category_id=category_id)
+
+        try:
+            result = get_cursor_page(query, UsersSearch, limit)
+        except ValueError:
+            logger.info(f'Users: Invalid cursor {request.args.get("cursor")}')
+            return make_response(jsonify(message='Invalid cursor'), 400)
+        return make_response(jsonify(result), 200)
+
+
+def get_cursor_page(query, resource, limit):
+    """
+    Returns one page of users ordered by (date_registration DESC, telegram_id DESC)
+    after the cursor from the request args. Raises ValueError for an invalid cursor.
+    """
+    cursor = request.args.get('cursor')
+    if cursor:
+        date_registration, telegram_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(User.date_registration, User.telegram_id) < tuple_(date_registration, telegram_id)
+        )
+    users = query.order_by(User.date_registration.desc(), User.telegram_id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    next_url = None
+    if len(users) > limit:
+        users = users[:limit]
+        next_cursor = encode_cursor(users[-1])
+        next_url = f'{api.url_for(resource)}?{urlencode({**request.args.to_dict(), "cursor": next_cursor})}'
+    return {'next_cursor': next_cursor,
+            'next_url': next_url,
+            'result': [formatter.user_formatter(user) for user in users]}
+
+
+def parse_limit(value):
+    """Returns the page size from the request or None if it is not an integer from 1 to MAX_PAGE_LIMIT."""
+    if value is None or value == '':
+        return config.PAGE_LIMIT
+    return parse_int(value, 1, config.MAX_PAGE_LIMIT)
+
+
+def parse_int(value, minimum, maximum):
+    """Returns the integer from the request or None if it is not an integer from minimum to maximum."""
+    try:
+        number = int(value)
+    except ValueError:
+        return None
+    return number if minimum <= number <= maximum else None
+
+
+def parse_bool(value):
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true')
+
+
+def encode_cursor(user):
+    value = json.dumps([user.date_registration.isoformat(), user.telegram_id])
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        date_registration, telegram_id = json.loads(value)
+        return datetime.fromisoformat(date_registration), int(telegram_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError) as ex:
+        raise ValueError(str(ex))
+
+
+def get_users_count_estimate():
+    """Number of users from the planner statistics, None if the table has not been analyzed yet"""
+    estimate = db_session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'users'::regclass")
+    ).scalar()
+    return estimate if estimate is not None and estimate >= 0 else None
+
+
 class UserItem(MethodResource, Resource):
     """Provides access to 'get', 'put' and 'delete' requests for items in User model"""
 
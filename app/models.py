@@ -5,9 +5,12 @@ from sqlalchemy import (Column,
                         String,
                         Boolean,
                         Date,
-                        BigInteger
+                        BigInteger,
+                        Index,
+                        UniqueConstraint
                         )
-from sqlalchemy.sql import expression, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import expression, func, text
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql.sqltypes import TIMESTAMP
@@ -61,6 +64,14 @@ class User(Base):
     external_signup_date = Column(TIMESTAMP, nullable=True)
     banned = Column(Boolean, server_default=expression.false(), nullable=False)
 
+    __table_args__ = (
+        Index('ix_users_date_registration_telegram_id', date_registration.desc(), telegram_id.desc()),
+        # Trigram indexes for the users search
+        *[Index(f'ix_users_{column}_trgm', column,
+                postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+          for column in ('username', 'email', 'first_name', 'last_name')],
+    )
+
     def __repr__(self):
         return f'<User {self.telegram_id}>'
 
@@ -78,10 +89,15 @@ class Task(Base):
     link = Column(String)
     description = Column(String)
     archive = Column(Boolean)
+    content_hash = Column(String(32), index=True)
     created_date = Column(TIMESTAMP, server_default=func.current_timestamp(), nullable=False)
     updated_date = Column(TIMESTAMP, server_default=func.current_timestamp(),
                           nullable=False, onupdate=func.current_timestamp())
 
+    __table_args__ = (
+        Index('ix_tasks_active_category_id_id', 'category_id', 'id', postgresql_where=text('archive = false')),
+    )
+
     def __repr__(self):
         return f'<Task {self.title}>'
 
@@ -92,6 +108,7 @@ class Category(Base):
     id = Column(Integer, primary_key=True)
     name = Column(String(100))
     archive = Column(Boolean())
+    content_hash = Column(String(32), index=True)
     users = relationship('User', secondary='users_categories', backref=backref('categories'))
     tasks = relationship('Task', backref=backref('categories'))
     parent_id = Column(Integer, ForeignKey('categories.id'))
@@ -106,16 +123,43 @@ class Category(Base):
 
 
 class Statistics(Base):
+    """Partitioned by month of added_date, see core.services.statistics_service."""
     __tablename__ = 'statistics'
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     telegram_id = Column(BigInteger)
     command = Column(String(100))
-    added_date = Column(TIMESTAMP, default=func.current_timestamp(), nullable=False)
+    added_date = Column(TIMESTAMP, default=func.current_timestamp(), primary_key=True, nullable=False)
+
+    __table_args__ = (
+        Index('ix_statistics_added_date_telegram_id', 'added_date', 'telegram_id'),
+        {'postgresql_partition_by': 'RANGE (added_date)'},
+    )
 
     def __repr__(self):
         return f'<Command {self.command}>'
 
 
+class DailyCommandStats(Base):
+    __tablename__ = 'daily_command_stats'
+    day = Column(Date, primary_key=True)
+    command = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class DailyActiveUser(Base):
+    __tablename__ = 'daily_active_users'
+    day = Column(Date, primary_key=True)
+    telegram_id = Column(BigInteger, primary_key=True)
+
+
+class DailyUserStats(Base):
+    __tablename__ = 'daily_user_stats'
+    day = Column(Date, primary_key=True)
+    added_users = Column(Integer, server_default='0', nullable=False)
+    added_external_users = Column(Integer, server_default='0', nullable=False)
+    users_unsubscribed = Column(Integer, server_default='0', nullable=False)
+
+
 class Notification(Base):
     __tablename__ = 'notifications'
     id = Column(Integer, primary_key=True)
@@ -123,11 +167,35 @@ class Notification(Base):
     was_sent = Column(Boolean, default=False)
     sent_date = Column(TIMESTAMP)
     sent_by = Column(String(48), nullable=True)
+    queued_count = Column(Integer, server_default='0', nullable=False)
+    sent_count = Column(Integer, server_default='0', nullable=False)
+    failed_count = Column(Integer, server_default='0', nullable=False)
 
     def __repr__(self):
         return f'<Notification {self.message[0:10]}>'
 
 
+class NotificationOutbox(Base):
+    __tablename__ = 'notifications_outbox'
+    __table_args__ = (
+        UniqueConstraint('notification_id', 'telegram_id'),
+        Index('ix_notifications_outbox_pending', 'id',
+              postgresql_where=text("status IN ('queued', 'sending')")),
+    )
+    id = Column(BigInteger, primary_key=True)
+    notification_id = Column(Integer, ForeignKey('notifications.id', ondelete='CASCADE'), nullable=False)
+    telegram_id = Column(BigInteger, nullable=False)
+    status = Column(String(16), server_default='queued', nullable=False)
+    attempts = Column(Integer, server_default='0', nullable=False)
+    last_error = Column(String(256), nullable=True)
+    claimed_date = Column(TIMESTAMP, nullable=True)
+    updated_date = Column(TIMESTAMP, server_default=func.current_timestamp(),
+                          nullable=False, onupdate=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<NotificationOutbox {self.notification_id} {self.telegram_id}>'
+
+
 class Users_Categories(Base):
     __tablename__ = 'users_categories'
     telegram_id = Column(BigInteger,
@@ -164,3 +232,55 @@ class ExternalSiteUser(Base):
 
     def __repr__(self):
         return f'<SiteUser {self.email}>'
+
+
+class SyncVersion(Base):
+    __tablename__ = 'sync_versions'
+    TASKS = 'tasks'
+    TASKS_DELTA = 'tasks_delta'
+    CATEGORIES = 'categories'
+    STATISTICS_ROLLUPS = 'statistics_rollups'
+    STATISTICS_PARTITIONS = 'statistics_partitions'
+
+    name = Column(String(32), primary_key=True)
+    version = Column(BigInteger, server_default='0', nullable=False)
+    updated_date = Column(TIMESTAMP, server_default=func.current_timestamp(),
+                          nullable=False, onupdate=func.current_timestamp())
+
+    def __repr__(self):
+        return f'<SyncVersion {self.name} {self.version}>'
+
+
+class WebhookJob(Base):
+    __tablename__ = 'webhook_jobs'
+    __table_args__ = (
+        Index('ix_webhook_jobs_pending', 'id',
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
+    KIND_TASKS = 'tasks'
+    KIND_CATEGORIES = 'categories'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(16), nullable=False)
+    status = Column(String(16), server_default='queued', nullable=False)
+    payload_path = Column(String(256), nullable=False)
+    result = Column(JSONB, nullable=True)
+    error = Column(String(1024), nullable=True)
+    attempts = Column(Integer, server_default='0', nullable=False)
+    created_date = Column(TIMESTAMP, server_default=func.current_timestamp(), nullable=False)
+    started_date = Column(TIMESTAMP, nullable=True)
+    finished_date = Column(TIMESTAMP, nullable=True)
+
+    def __repr__(self):
+        return f'<WebhookJob {self.id} {self.kind} {self.status}>'
+
+
+class BotPersistence(Base):
+    __tablename__ = 'bot_persistence'
+    kind = Column(String(64), primary_key=True)
+    key = Column(String(64), primary_key=True)
+    data = Column(JSONB, nullable=False)
+    updated_date = Column(TIMESTAMP, server_default=func.current_timestamp(), nullable=False)
+
+    def __repr__(self):
+        return f'<BotPersistence {self.kind} {self.key}>'
@@ -1,3 +1,6 @@
+import hashlib
+import json
+
 from pydantic import BaseModel, Extra, NonNegativeInt
 
 
@@ -8,3 +11,8 @@ class RequestBase(BaseModel):
 
     class Config:
         extra = Extra.forbid
+
+    def content_hash(self) -> str:
+        """Стабильный хеш всех полей модели для поиска изменений."""
+        data = json.dumps(self.dict(), sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from typing import Optional
-from pydantic import Extra, Field, HttpUrl, NonNegativeInt, StrictStr, validator
+from pydantic import BaseModel, Extra, Field, HttpUrl, NonNegativeInt, PositiveInt, StrictStr, validator
 
 from app.request_models.request_base import RequestBase
 
@@ -21,3 +21,13 @@ class TaskCreateRequest(RequestBase):
     @validator('deadline', pre=True)
     def validate_deadline(cls, deadline):
         return datetime.strptime(deadline, '%d.%m.%Y')
+
+
+class TaskDeltaRequest(BaseModel):
+    """Изменения заданий с момента предыдущей версии."""
+    version: PositiveInt
+    upsert: list[TaskCreateRequest] = []
+    archive: list[NonNegativeInt] = []
+
+    class Config:
+        extra = Extra.forbid
@@ -4,10 +4,13 @@ from flask_restful import Api
 from . import tasks
 from . import categories
 from . import health_check
+from . import jobs
 
 webhooks_bp = Blueprint('webhooks_bp', __name__)
 wh_api = Api(webhooks_bp)
 
 wh_api.add_resource(tasks.CreateTasks, '/api/v1/tasks/')
+wh_api.add_resource(tasks.TasksDelta, '/api/v1/tasks/delta/')
 wh_api.add_resource(categories.CreateCategories, '/api/v1/categories/')
 wh_api.add_resource(health_check.HealthCheck, '/api/v1/health_check/')
+wh_api.add_resource(jobs.WebhookJobItem, '/api/v1/jobs/<int:job_id>/')
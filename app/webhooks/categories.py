@@ -2,23 +2,36 @@ from flask import request
 from flask_apispec import doc
 from flask_apispec.views import MethodResource
 from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
 
 from app.database import db_session
-from app.models import Category
+from app.error_handlers import InvalidAPIUsage
+from app.logger import webhooks_logger as logger
+from app.models import SyncVersion, WebhookJob
 from app.request_models.category import CategoryCreateRequest
-from app.webhooks.check_request import request_to_context
+from app.webhooks.check_request import iter_request_items
 from app.webhooks.check_webhooks_token import check_webhooks_token
+from app.webhooks.jobs import enqueue_webhook_job
 from core.repositories.category_repository import CategoryRepository
+from core.repositories.sync_version_repository import SyncVersionRepository
+from core.services.category_tree_service import category_tree_service
 
 
 category_repository = CategoryRepository(db_session)
+sync_version_repository = SyncVersionRepository(db_session)
 
 
 class CreateCategories(MethodResource, Resource):
     method_decorators = {'post': [check_webhooks_token]}
 
-    @doc(description='Сreates Categories in the database',
+    @doc(description='Queues the full list of categories for synchronization. '
+                     'The result is available from /api/v1/jobs/<job_id>/',
          tags=['Create categories'],
+         responses={
+             202: {'description': 'Job id of the queued synchronization'},
+             400: {'description': 'error message'},
+             403: {'description': 'Access is denied'}
+         },
          params={'token': {
              'description': 'webhooks token',
              'in': 'header',
@@ -26,66 +39,57 @@ class CreateCategories(MethodResource, Resource):
              'required': True
          }})
     def post(self):
-        categories = request_to_context(CategoryCreateRequest, request)
-        categories_dict = {category.id: category for category in categories}
-
-        categories_db = category_repository.get_all_categories()
-
-        category_id_json = [member.id for member in categories]
-        category_id_db = [member.id for member in categories_db]
-
-        category_id_db_not_archive = [member.id for member in categories_db if member.archive is False]
-        category_id_db_archive = list(set(category_id_db) - set(category_id_db_not_archive))
-
-        category_for_unarchive = list(set(category_id_db_archive) & set(category_id_json))
-        category_for_adding_db = list(set(category_id_json) - set(category_id_db))
-        category_for_archive = list(set(category_id_db_not_archive) - set(category_id_json))
-
-        categories_for_add = []
-
-        for category in categories:
-            if category.id in category_for_adding_db:
-                c = Category(
-                    id=category.id,
-                    name=category.name,
-                    archive=False,
-                    parent_id=category.parent_id
-                )
-                categories_for_add.append(c)
-
-        archive_records = [category for category in categories_db if category.id in category_for_archive]
-        for category in archive_records:
-            category.archive = True
-        unarchive_records = [category for category in categories_db if category.id in category_for_unarchive]
-
-        categories_for_update = list(
-            set(category_id_json) - set(category_for_archive) - set(category_for_adding_db))
-
-        active_category = [category for category in categories_db if category.id in categories_for_update]
-
-        if active_category:
-            self.__update_active_category(active_category, categories_dict)
-
-        for task in unarchive_records:
-            task.archive = False
-
-        return category_repository.update_categories(categories_for_add)
-
-    def __hash__(self, category):
-        if type(category) == dict:
-            id = category.get('id')
-            name = category.get('name')
-            parent_id = category.get('parent_id')
-            return hash(f'{id}{name}{parent_id}')
-        return hash(f'{category.id}{category.name}{category.parent_id}')
-
-    def __update_active_category(self, active_category, categories):
-        for category in active_category:
-            category_from_dict = categories.get(category.id)
-            if self.__hash__(category) != self.__hash__(category_from_dict):
-                self.__update_category_fields(category, category_from_dict)
-
-    def __update_category_fields(self, category, category_from_dict):
-        category.name = category_from_dict.name
-        category.parent_id = category_from_dict.parent_id
-        category.archive = False
+        return enqueue_webhook_job(WebhookJob.KIND_CATEGORIES, request)
+
+
+def sync_categories(stream):
+    """
+    Applies the full list of categories: writes new and changed categories
+    and archives the missing ones.
+
+    :param stream: Binary stream with the JSON array of categories
+    :return: Added, archived, updated and rejected categories
+    """
+    rejected_categories = []
+    seen_ids = set()
+    categories = iter_request_items(CategoryCreateRequest, stream, rejected_categories, seen_ids)
+    categories = list({category.id: category for category in categories}.values())
+    if not categories:
+        logger.error('Categories: Json contains no valid categories')
+        raise InvalidAPIUsage({'message': 'Json contains no valid categories',
+                               'rejected_categories': rejected_categories})
+
+    try:
+        sync_version = sync_version_repository.lock(SyncVersion.CATEGORIES)
+        archived_categories = category_repository.archive_missing(list(seen_ids))
+        known_categories = category_repository.get_content_hashes()
+        active_pairs = {
+            (category.id, category.content_hash)
+            for category in known_categories.values() if not category.archive
+        }
+        incoming_pairs = {(category.id, category.content_hash()) for category in categories}
+        changed_ids = {category_id for category_id, _ in incoming_pairs - active_pairs}
+        written_categories = category_repository.upsert(
+            [category for category in categories if category.id in changed_ids]
+        )
+        if archived_categories or written_categories:
+            sync_version.version += 1
+        db_session.commit()
+    except SQLAlchemyError as ex:
+        logger.error(f'Categories: Database commit error "{str(ex)}"')
+        db_session.rollback()
+        raise InvalidAPIUsage({'message': f'Bad request: {str(ex)}'})
+
+    if archived_categories or written_categories:
+        category_tree_service.reload()
+    added_categories = [category.id for category in written_categories if category.inserted]
+    updated_categories = [category.id for category in written_categories if not category.inserted]
+    logger.info(f'Categories: Added {len(added_categories)} new categories: {added_categories}')
+    logger.info(f'Categories: Archived {len(archived_categories)} categories: {archived_categories}')
+    logger.info(f'Categories: Updated {len(updated_categories)} categories: {updated_categories}')
+    if rejected_categories:
+        logger.info(f'Categories: Rejected {len(rejected_categories)} invalid categories.')
+    return dict(added_categories=added_categories,
+                archived_categories=archived_categories,
+                updated_categories=updated_categories,
+                rejected_categories=rejected_categories)
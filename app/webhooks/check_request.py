@@ -1,16 +1,127 @@
+import codecs
+import json
+import re
+
 from pydantic import parse_obj_as, ValidationError
 from werkzeug.exceptions import BadRequest
 
 from app.logger import webhooks_logger as logger
 
+READ_SIZE = 64 * 1024
+WHITESPACE = ' \t\n\r'
+# A token cut by the end of the buffer fails to decode at most this far
+# from the end, the longest one is a \uXXXX escape
+MAX_CUT_TOKEN = 6
+NUMBER_TAIL = re.compile(r'[0-9eE.+-]*')
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """
+    Parses a JSON array from a binary stream element by element,
+    so only the current element and one read buffer are kept in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    state = 'start'
+    while True:
+        while position < len(buffer) and buffer[position] in WHITESPACE:
+            position += 1
+        need_more = position == len(buffer)
+
+        if not need_more:
+            char = buffer[position]
+            if state == 'start':
+                if char != '[':
+                    raise ValueError('JSON array expected')
+                position += 1
+                state = 'first'
+                continue
+            if state == 'end':
+                raise ValueError(f'Unexpected data after JSON array {char!r}')
+            if state in ('first', 'separator') and char == ']':
+                # Only whitespace may follow the array
+                position += 1
+                state = 'end'
+                continue
+            if state == 'separator':
+                if char != ',':
+                    raise ValueError(f'Unexpected character {char!r}')
+                position += 1
+                state = 'value'
+                continue
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+                # A number may go on in the next read, like 1.5 of 1.5e3
+                need_more = not eof and (end == len(buffer) or (
+                    isinstance(element, (int, float)) and not isinstance(element, bool)
+                    and NUMBER_TAIL.fullmatch(buffer, end) is not None
+                ))
+            except json.JSONDecodeError as ex:
+                # Only an element cut by the end of the buffer is read further,
+                # invalid data fails at once instead of buffering the whole stream
+                if eof or (ex.pos < len(buffer) - MAX_CUT_TOKEN and not ex.msg.startswith('Unterminated string')):
+                    raise
+                need_more = True
+            if not need_more:
+                yield element
+                position = end
+                state = 'separator'
+                continue
+
+        if eof:
+            if state == 'end':
+                return
+            raise ValueError('Unexpected end of JSON data')
+        chunk = stream.read(read_size)
+        eof = not chunk
+        buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+        position = 0
+
+
+def iter_request_items(context, stream, errors, seen_ids):
+    """
+    Validates every element of the JSON array from the stream with the context model.
+    Invalid elements are reported into `errors` instead of rejecting the request;
+    ids of all elements, valid or not, are collected into `seen_ids`.
+    """
+    try:
+        for index, item in enumerate(iter_json_array(stream)):
+            item_id = item.get('id') if isinstance(item, dict) else None
+            try:
+                record = context.parse_obj(item)
+            except ValidationError as error:
+                logger.error(f'{context}: element {index} is invalid: {error}')
+                errors.append({'index': index, 'id': item_id, 'errors': json.loads(error.json())})
+                if str(item_id).isdigit():
+                    seen_ids.add(int(item_id))
+                continue
+            seen_ids.add(record.id)
+            yield record
+    except ValueError as error:
+        logger.error(f'{context}: Invalid json "{error}"')
+        raise BadRequest(f'Invalid json: {error}')
+
+
+def iter_request_chunks(context, stream, errors, seen_ids, size):
+    chunk = []
+    for record in iter_request_items(context, stream, errors, seen_ids):
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
 
-def request_to_context(context, request):
+def request_to_model(model, request):
     if not request.json:
-        logger.error(f'{context}: Json contains no data')
+        logger.error(f'{model}: Json contains no data')
         raise BadRequest('Json contains no data')
     try:
-        request_data = parse_obj_as(list[context], obj=request.json)
-        return request_data
+        return parse_obj_as(model, obj=request.json)
     except ValidationError as error:
         logger.error(f'{error}')
         raise BadRequest(error)
@@ -9,12 +9,14 @@ from flask_restful import Resource
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.sql import func
 
+from app.cache import analytics_cache
 from app.config import HOST_NAME, USE_WEBHOOK
 from app.models import User, Task
 from app.database import db_session
 from app.logger import app_logger as logger
 
 from bot import charity_bot
+from bot.update_metrics import update_queue_metrics
 
 
 class HealthCheck(MethodResource, Resource):
@@ -23,7 +25,10 @@ class HealthCheck(MethodResource, Resource):
     def get(self):
         return make_response(jsonify(db=check_db_connection(),
                                      bot=check_bot(),
-                                     git=get_last_commit()), 200)
+                                     git=get_last_commit(),
+                                     analytics_cache=analytics_cache.get_metrics(),
+                                     update_queue=update_queue_metrics.get_metrics(
+                                         charity_bot.dispatcher.update_queue)), 200)
 
 
 def check_db_connection():
@@ -0,0 +1,104 @@
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+from telegram.ext import CallbackContext
+from werkzeug.exceptions import HTTPException
+
+from app import config
+from app.database import db_session
+from app.error_handlers import InvalidAPIUsage
+from app.logger import webhooks_logger as logger
+from app.models import WebhookJob
+from app.webhooks.categories import sync_categories
+from app.webhooks.jobs import STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, STATUS_RUNNING
+from app.webhooks.tasks import sync_tasks
+
+JOB_HANDLERS = {
+    WebhookJob.KIND_TASKS: sync_tasks,
+    WebhookJob.KIND_CATEGORIES: sync_categories,
+}
+
+worker_lock = threading.Lock()
+
+
+def process_webhook_jobs(context: CallbackContext) -> None:
+    """
+    Job callback: runs queued webhook jobs one by one in the order they were received.
+    Jobs left running by a crashed process are started again after WEBHOOK_JOBS_TIMEOUT seconds,
+    up to WEBHOOK_JOBS_MAX_ATTEMPTS times.
+    """
+    if not worker_lock.acquire(blocking=False):
+        return
+    try:
+        while run_next_job():
+            pass
+    except SQLAlchemyError as ex:
+        logger.error(f'Webhook jobs: Database error "{str(ex)}"')
+        db_session.rollback()
+    finally:
+        worker_lock.release()
+        db_session.remove()
+
+
+def claim_job():
+    now = datetime.now()
+    stale_date = now - timedelta(seconds=config.WEBHOOK_JOBS_TIMEOUT)
+    job = WebhookJob.query.filter(
+        or_(WebhookJob.status == STATUS_QUEUED,
+            and_(WebhookJob.status == STATUS_RUNNING, WebhookJob.started_date < stale_date))
+    ).order_by(WebhookJob.id).with_for_update(skip_locked=True).first()
+    if job:
+        job.status = STATUS_RUNNING
+        job.started_date = now
+        job.attempts += 1
+    db_session.commit()
+    return job
+
+
+def run_next_job():
+    job = claim_job()
+    if not job:
+        return False
+
+    if job.attempts > config.WEBHOOK_JOBS_MAX_ATTEMPTS:
+        job.status = STATUS_FAILED
+        job.error = f'Job was interrupted {job.attempts - 1} times'
+        job.finished_date = datetime.now()
+        db_session.commit()
+        logger.error(f'Webhook jobs: Job {job.id} for {job.kind} failed after {job.attempts - 1} attempts')
+        remove_payload(job)
+        return True
+
+    logger.info(f'Webhook jobs: Job {job.id} for {job.kind} started')
+    try:
+        with open(job.payload_path, 'rb') as payload:
+            job.result = JOB_HANDLERS[job.kind](payload)
+        job.status = STATUS_DONE
+    except InvalidAPIUsage as ex:
+        db_session.rollback()
+        job.status = STATUS_FAILED
+        job.result = ex.message
+        job.error = str(ex.message.get('message'))
+    except HTTPException as ex:
+        db_session.rollback()
+        job.status = STATUS_FAILED
+        job.error = str(ex.description)[:1024]
+    except Exception as ex:
+        logger.error(f'Webhook jobs: Job {job.id} for {job.kind} error "{str(ex)}"', exc_info=True)
+        db_session.rollback()
+        job.status = STATUS_FAILED
+        job.error = str(ex)[:1024]
+    job.finished_date = datetime.now()
+    db_session.commit()
+    logger.info(f'Webhook jobs: Job {job.id} for {job.kind} finished with status {job.status}')
+
+    remove_payload(job)
+    return True
+
+
+def remove_payload(job):
+    if os.path.exists(job.payload_path):
+        os.remove(job.payload_path)
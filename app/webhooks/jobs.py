@@ -0,0 +1,93 @@
+import os
+import shutil
+import uuid
+
+from flask import jsonify, make_response
+from flask_apispec import doc
+from flask_apispec.views import MethodResource
+from flask_restful import Resource
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import config
+from app.database import db_session
+from app.logger import webhooks_logger as logger
+from app.models import WebhookJob
+from app.webhooks.check_webhooks_token import check_webhooks_token
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def enqueue_webhook_job(kind, request):
+    """
+    Copies the request body into the jobs directory and creates a queued job for it.
+    The body is copied as a stream, so the payload is never held in memory.
+
+    :return: 202 response with the job id or 400 response if the job can not be saved
+    """
+    os.makedirs(config.WEBHOOK_JOBS_DIR, exist_ok=True)
+    payload_path = os.path.join(config.WEBHOOK_JOBS_DIR, f'{kind}_{uuid.uuid4().hex}.json')
+    with open(payload_path, 'wb') as payload:
+        shutil.copyfileobj(request.stream, payload)
+
+    job = WebhookJob(kind=kind, payload_path=payload_path)
+    db_session.add(job)
+    try:
+        db_session.commit()
+    except SQLAlchemyError as ex:
+        logger.error(f'Webhook jobs: Database commit error "{str(ex)}"')
+        db_session.rollback()
+        os.remove(payload_path)
+        return make_response(jsonify(message='Bad request'), 400)
+
+    logger.info(f'Webhook jobs: Job {job.id} for {kind} queued')
+    return make_response(jsonify(job_id=job.id,
+                                 status=job.status,
+                                 status_url=f'/api/v1/jobs/{job.id}/'), 202)
+
+
+def job_formatter(job):
+    queue_time = None
+    processing_time = None
+    if job.started_date:
+        queue_time = (job.started_date - job.created_date).total_seconds()
+    if job.started_date and job.finished_date:
+        processing_time = (job.finished_date - job.started_date).total_seconds()
+    return {
+        'job_id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'result': job.result,
+        'error': job.error,
+        'attempts': job.attempts,
+        'created_date': job.created_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'started_date': job.started_date.strftime('%Y-%m-%d %H:%M:%S') if job.started_date else None,
+        'finished_date': job.finished_date.strftime('%Y-%m-%d %H:%M:%S') if job.finished_date else None,
+        'queue_time': queue_time,
+        'processing_time': processing_time,
+    }
+
+
+class WebhookJobItem(MethodResource, Resource):
+    method_decorators = {'get': [check_webhooks_token]}
+
+    @doc(description='Status and result of the tasks or categories synchronization job',
+         tags=['Webhook jobs'],
+         responses={
+             200: {'description': 'Job status, changed ids and timings'},
+             403: {'description': 'Access is denied'},
+             404: {'description': 'Job not found'}
+         },
+         params={'token': {
+             'description': 'webhooks token',
+             'in': 'header',
+             'type': 'string',
+             'required': True
+         }})
+    def get(self, job_id):
+        job = WebhookJob.query.get(job_id)
+        if not job:
+            return make_response(jsonify(message=f'Job {job_id} not found'), 404)
+        return make_response(jsonify(job_formatter(job)), 200)
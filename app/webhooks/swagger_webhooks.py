@@ -1,9 +1,12 @@
 from app import docs
 from app.webhooks.categories import CreateCategories
 from app.webhooks.health_check import HealthCheck
-from app.webhooks.tasks import CreateTasks
+from app.webhooks.jobs import WebhookJobItem
+from app.webhooks.tasks import CreateTasks, TasksDelta
 
 
 docs.register(CreateCategories, blueprint='webhooks_bp')
 docs.register(CreateTasks, blueprint='webhooks_bp')
+docs.register(TasksDelta, blueprint='webhooks_bp')
 docs.register(HealthCheck, blueprint='webhooks_bp')
+docs.register(WebhookJobItem, blueprint='webhooks_bp')
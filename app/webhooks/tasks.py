@@ -1,31 +1,43 @@
-import datetime
-import pytz
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, groupby, zip_longest
+from operator import attrgetter
+
 from flask import request, jsonify, make_response
 from flask_apispec import doc
 from flask_apispec.views import MethodResource
 from flask_restful import Resource
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import load_only
 
+from app import config
 from app.database import db_session
 from app.logger import webhooks_logger as logger
-from app.models import Task, Category
-from app.request_models.task import TaskCreateRequest
-from app.webhooks.check_request import request_to_context
+from app.error_handlers import InvalidAPIUsage
+from app.models import SyncVersion, WebhookJob
+from app.request_models.task import TaskCreateRequest, TaskDeltaRequest
+from app.webhooks.check_request import iter_request_chunks, request_to_model
 from app.webhooks.check_webhooks_token import check_webhooks_token
+from app.webhooks.jobs import enqueue_webhook_job
+from bot.formatter import display_task_notification, display_tasks_digest, task_message_cache
+from bot.mailing import SendUserMessageContext
+from bot.messages import mailing_engine
+from core.repositories.sync_version_repository import SyncVersionRepository
+from core.repositories.task_repository import TaskRepository
+
 
-from bot.charity_bot import dispatcher
-from bot.formatter import display_task_notification
-from bot.messages import TelegramNotification, SendUserMessageContext, SendUserNotificationsContext
+task_repository = TaskRepository(db_session)
+sync_version_repository = SyncVersionRepository(db_session)
+# The delta request and the sync job do not wait until their notifications are delivered
+notifications_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='task_notifications')
 
 
 class CreateTasks(MethodResource, Resource):
     method_decorators = {'post': [check_webhooks_token]}
 
-    @doc(description='Сreates tasks in the database',
+    @doc(description='Queues the full list of active tasks for synchronization. '
+                     'The result is available from /api/v1/jobs/<job_id>/',
          tags=['Create tasks'],
          responses={
-             200: {'description': 'ok'},
+             202: {'description': 'Job id of the queued synchronization'},
              400: {'description': 'error message'},
              403: {'description': 'Access is denied'}
          },
@@ -37,154 +49,232 @@ class CreateTasks(MethodResource, Resource):
          }},
          )
     def post(self):
-        tasks = request_to_context(TaskCreateRequest, request)
-
-        tasks_dict = {task.id: task for task in tasks}
-        tasks_db = Task.query.options(load_only('archive')).all()
-        task_id_json = [task.id for task in tasks]
-        task_id_db = [task.id for task in tasks_db]
-
-        task_to_send = []
-
-        task_id_db_not_archive = [task.id for task in tasks_db if task.archive is False]
-        task_for_archive = list(set(task_id_db_not_archive) - set(task_id_json))
-        archive_records = [task for task in tasks_db if task.id in task_for_archive]
-        archived_tasks = self.__archive_tasks(archive_records)
+        return enqueue_webhook_job(WebhookJob.KIND_TASKS, request)
 
-        task_id_db_archive = list(set(task_id_db) - set(task_id_db_not_archive))
-        task_for_unarchive = list(set(task_id_db_archive) & set(task_id_json))
-        unarchive_records = [task for task in tasks_db if task.id in task_for_unarchive]
-        unarchived_tasks = self.__unarchive_tasks(unarchive_records, task_to_send, tasks_dict)
 
-        task_for_adding_db = list(set(task_id_json) - set(task_id_db))
-        tasks_to_add = [task for task in tasks if task.id in task_for_adding_db]
-        added_tasks = self.__add_tasks(tasks_to_add, task_to_send)
+class TasksDelta(MethodResource, Resource):
+    method_decorators = {'post': [check_webhooks_token]}
 
-        task_id_db_active = list(
-            set(task_id_json) - set(task_for_archive) - set(task_for_unarchive) - set(task_for_adding_db)
-        )
-        active_tasks = [task for task in tasks_db if task.id in task_id_db_active]       
-        updated_tasks = self.__update_active_tasks(active_tasks, task_to_send, tasks_dict)
+    @doc(description='Applies changed tasks and archives the listed ones. '
+                     'The version must grow with every delta, a repeated version is ignored.',
+         tags=['Create tasks'],
+         responses={
+             200: {'description': 'ok'},
+             400: {'description': 'error message'},
+             403: {'description': 'Access is denied'}
+         },
+         params={'token': {
+             'description': 'webhooks token',
+             'in': 'header',
+             'type': 'string',
+             'required': True
+         }},
+         )
+    def post(self):
+        delta = request_to_model(TaskDeltaRequest, request)
+        tasks = list({task.id: task for task in delta.upsert}.values())
 
         try:
+            # The full sync locks the same row, so both paths write tasks one at a time
+            sync_version_repository.lock(SyncVersion.TASKS)
+            sync_version = sync_version_repository.lock(SyncVersion.TASKS_DELTA)
+            if delta.version <= sync_version.version:
+                db_session.rollback()
+                logger.info(f'Tasks delta: Version {delta.version} has already been applied')
+                return make_response(jsonify(version=sync_version.version,
+                                             applied=False,
+                                             added_tasks=[],
+                                             archived_tasks=[],
+                                             unarchived_tasks=[],
+                                             updated_tasks=[]), 200)
+            added_tasks, unarchived_tasks, updated_tasks = write_tasks(tasks)
+            archived_tasks = task_repository.archive(delta.archive)
+            sync_version.version = delta.version
             db_session.commit()
         except SQLAlchemyError as ex:
-            logger.error(f'Tasks: database commit error "{str(ex)}"')
+            logger.error(f'Tasks delta: database commit error "{str(ex)}"')
             db_session.rollback()
             return make_response(jsonify(message='Bad request'), 400)
-        logger.info(f'Tasks: Tasks to send - {task_to_send}')
 
-        self.preparing_tasks_for_send(task_to_send)
+        log_tasks_changes(added_tasks, archived_tasks, unarchived_tasks, updated_tasks)
+        task_message_cache.invalidate(archived_tasks + unarchived_tasks + updated_tasks)
+        archived = set(archived_tasks)
+        notifications_executor.submit(
+            send_tasks_notifications,
+            [task_id for task_id in added_tasks + unarchived_tasks + updated_tasks if task_id not in archived]
+        )
 
-        logger.info('Tasks: New tasks received')
-        logger.info('——————————————————————————————————————————————————————')
-        return make_response(jsonify(added_tasks=added_tasks,
+        logger.info(f'Tasks delta: Version {delta.version} applied')
+        return make_response(jsonify(version=delta.version,
+                                     applied=True,
+                                     added_tasks=added_tasks,
                                      archived_tasks=archived_tasks,
                                      unarchived_tasks=unarchived_tasks,
                                      updated_tasks=updated_tasks), 200)
 
-    def preparing_tasks_for_send(self, task_to_send):
-        if not task_to_send:
-            logger.info('Tasks: No tasks to send')
-            return
 
-        logger.info(
-            f'Tasks: Tasks passed to the preparing_tasks_for_send method - {[(task.id, task.title) for task in task_to_send]}'
+def sync_tasks(stream):
+    """
+    Applies the full list of active tasks: writes new and changed tasks,
+    archives the missing ones and queues notifications.
+
+    :param stream: Binary stream with the JSON array of tasks
+    :return: Added, archived, unarchived, updated and rejected tasks
+    """
+    rejected_tasks = []
+    seen_ids = set()
+    valid_count = 0
+    added_tasks = []
+    unarchived_tasks = []
+    updated_tasks = []
+    try:
+        sync_version = sync_version_repository.lock(SyncVersion.TASKS)
+        for tasks in iter_request_chunks(TaskCreateRequest, stream, rejected_tasks, seen_ids,
+                                         config.TASKS_UPSERT_CHUNK_SIZE):
+            valid_count += len(tasks)
+            added, unarchived, updated = write_tasks(list({task.id: task for task in tasks}.values()))
+            added_tasks += added
+            unarchived_tasks += unarchived
+            updated_tasks += updated
+        if not valid_count:
+            db_session.rollback()
+            logger.error('Tasks: Json contains no valid tasks')
+            raise InvalidAPIUsage({'message': 'Json contains no valid tasks', 'rejected_tasks': rejected_tasks})
+        archived_tasks = task_repository.archive_missing(list(seen_ids))
+        sync_version.version += 1
+        db_session.commit()
+    except SQLAlchemyError as ex:
+        logger.error(f'Tasks: database commit error "{str(ex)}"')
+        db_session.rollback()
+        raise InvalidAPIUsage({'message': 'Bad request'})
+
+    log_tasks_changes(added_tasks, archived_tasks, unarchived_tasks, updated_tasks)
+    task_message_cache.invalidate(archived_tasks + unarchived_tasks + updated_tasks)
+    if rejected_tasks:
+        logger.info(f'Tasks: Rejected {len(rejected_tasks)} invalid tasks.')
+    notifications_executor.submit(send_tasks_notifications, added_tasks + unarchived_tasks + updated_tasks)
+
+    logger.info('Tasks: New tasks received')
+    logger.info('——————————————————————————————————————————————————————')
+    return dict(added_tasks=added_tasks,
+                archived_tasks=archived_tasks,
+                unarchived_tasks=unarchived_tasks,
+                updated_tasks=updated_tasks,
+                rejected_tasks=rejected_tasks)
+
+
+def write_tasks(tasks):
+    """
+    Writes new, changed and archived tasks from the request.
+    Active tasks with the same content hash are skipped.
+
+    :param tasks: Validated tasks without duplicate ids
+    :return: Added, unarchived and updated task ids
+    """
+    added_tasks = []
+    unarchived_tasks = []
+    updated_tasks = []
+    known_tasks = task_repository.get_content_hashes([task.id for task in tasks])
+    active_pairs = {(task.id, task.content_hash) for task in known_tasks.values() if not task.archive}
+    incoming_pairs = {(task.id, task.content_hash()) for task in tasks}
+    changed_ids = {task_id for task_id, _ in incoming_pairs - active_pairs}
+    tasks_to_write = [task for task in tasks if task.id in changed_ids]
+    for i in range(0, len(tasks_to_write), config.TASKS_UPSERT_CHUNK_SIZE):
+        for task in task_repository.upsert(tasks_to_write[i:i + config.TASKS_UPSERT_CHUNK_SIZE]):
+            known_task = known_tasks.get(task.id)
+            if task.inserted:
+                added_tasks.append(task.id)
+            elif known_task is None:
+                # Inserted by a concurrent transaction after the hashes were read
+                updated_tasks.append(task.id)
+            elif known_task.archive:
+                unarchived_tasks.append(task.id)
+            elif known_task.content_hash is None:
+                # A task stored before content hashes: refreshed silently, users already know it
+                continue
+            else:
+                updated_tasks.append(task.id)
+    return added_tasks, unarchived_tasks, updated_tasks
+
+
+def log_tasks_changes(added_tasks, archived_tasks, unarchived_tasks, updated_tasks):
+    logger.info(f'Tasks: Added {len(added_tasks)} new tasks.')
+    logger.info(f'Tasks: Added task IDs: {added_tasks}')
+    logger.info(f'Tasks: Archived {len(archived_tasks)} tasks.')
+    logger.info(f'Tasks: Archived task ids: {archived_tasks}')
+    logger.info(f'Tasks: Unarchived {len(unarchived_tasks)} tasks.')
+    logger.info(f'Tasks: Unarchived task IDs: {unarchived_tasks}')
+    logger.info(f'Tasks: Updated {len(updated_tasks)} active tasks.')
+    logger.info(f'Tasks: Updated active task ids: {updated_tasks}')
+
+
+def preparing_tasks_for_send(task_ids):
+    if not task_ids:
+        logger.info('Tasks: No tasks to send')
+        return
+
+    logger.info(f'Tasks: Tasks to send - {task_ids}')
+    messages = {
+        task.id: display_task_notification(task)
+        for task in task_repository.get_tasks_with_category(task_ids)
+    }
+    recipients = chain.from_iterable(
+        task_repository.iter_task_recipients(task_ids, config.TASK_NOTIFICATION_CHUNK_SIZE)
+    )
+
+    users_count = 0
+    failed_count = 0
+    chunk_size = 0
+    users_messages = []
+    for telegram_id, user_tasks in groupby(recipients, key=attrgetter('telegram_id')):
+        user_messages = [messages[user_task.task_id] for user_task in user_tasks]
+        if config.TASK_NOTIFICATION_DIGEST:
+            user_messages = display_tasks_digest(user_messages)
+        users_messages.append(
+            [SendUserMessageContext(message=message, telegram_id=telegram_id) for message in user_messages]
         )
-        notification = TelegramNotification()
-
-        send_time = datetime.datetime.now(pytz.utc)
-        for task in task_to_send:
-            category_id = task.category_id
-            users = Category.query.filter_by(id=category_id).first().users
-            logger.info(
-                f'Tasks: Users with a subscription to {category_id} category in DB - {[user.telegram_id for user in users]}'
-            )
-            message = display_task_notification(task)
-            user_notification_context = SendUserNotificationsContext([])
-            for user in users:
-                if user.has_mailing:
-                    user_message_context = SendUserMessageContext(message=message, telegram_id=user.telegram_id)
-                    user_notification_context.user_message_context.append(user_message_context)
-            logger.info(
-                f"Tasks: User's mailing list - {[user_message_context.telegram_id for user_message_context in user_notification_context.user_message_context]}"
-            )
-            if len(user_notification_context.user_message_context) != 0:
-                dispatcher.job_queue.run_once(notification.send_batch_messages,
-                                              send_time,
-                                              context=user_notification_context,
-                                              name=f'Sending: {message[0:10]}')
-
-                logger.info(f'Tasks: submitting task: {task.id} {task.title}')
-            # Adds a 10 second delay before processing the next task
-            send_time = send_time + datetime.timedelta(seconds=10)
-
-    def __add_tasks(self, tasks_to_add, task_to_send):
-        task_ids = [task.id for task in tasks_to_add]
-        for task in tasks_to_add:
-            new_task = Task(
-                id=task.id,
-                title=task.title,
-                name_organization=task.name_organization,
-                deadline=task.deadline,
-                category_id=task.category_id,
-                bonus=task.bonus,
-                location=task.location,
-                link=task.link,
-                description=task.description
-                )
-            new_task.archive = False
-            db_session.add(new_task)
-            task_to_send.append(new_task)
-        logger.info(f'Tasks: Added {len(tasks_to_add)} new tasks.')
-        logger.info(f'Tasks: Added task IDs: {task_ids}')
-        return task_ids
-
-    def __archive_tasks(self, archive_records):
-        task_ids = [task.id for task in archive_records]
-        for task in archive_records:
-            task.archive = True
-        logger.info(f'Tasks: Archived {len(archive_records)} tasks.')
-        logger.info(f'Tasks: Archived task ids: {task_ids}')
-        return task_ids
-
-    def __unarchive_tasks(self, unarchive_records, task_to_send, tasks_dict):
-        task_ids = [task.id for task in unarchive_records]
-        for task in unarchive_records:
-            task_from_dict = tasks_dict.get(task.id)
-            self.__update_task_fields(task, task_from_dict)
-            task_to_send.append(task)
-        logger.info(f'Tasks: Unarchived {len(unarchive_records)} tasks.')
-        logger.info(f'Tasks: Unarchived task IDs: {task_ids}')
-        return task_ids
-
-    def __hash__(self, task):
-        if type(task) == dict:
-            title = task.get('title')
-            description = task.get('description')
-            deadline = task.get('deadline')
-            return hash(f'{title}{description}{deadline}')
-        return hash(f'{task.title}{task.description}{task.deadline}')
-
-    def __update_active_tasks(self, active_tasks, task_to_send, tasks_dict):
-        updated_task_ids = []
-        for task in active_tasks:
-            task_from_dict = tasks_dict.get(task.id)
-            if self.__hash__(task) != self.__hash__(task_from_dict):
-                self.__update_task_fields(task, task_from_dict)
-                task_to_send.append(task)
-                updated_task_ids.append(task.id)
-        logger.info(f'Tasks: Updated {len(updated_task_ids)} active tasks.')
-        logger.info(f'Tasks: Updated active task ids: {updated_task_ids}')
-        return updated_task_ids
-
-    def __update_task_fields(self, task, task_from_dict):
-        task.title = task_from_dict.title
-        task.name_organization = task_from_dict.name_organization
-        task.category_id = task_from_dict.category_id
-        task.bonus = task_from_dict.bonus
-        task.location = task_from_dict.location
-        task.link = task_from_dict.link
-        task.description = task_from_dict.description
-        task.deadline = task_from_dict.deadline
-        task.archive = False
+        users_count += 1
+        chunk_size += len(user_messages)
+        if chunk_size >= config.TASK_NOTIFICATION_CHUNK_SIZE:
+            failed_count += send_chunk(interleave(users_messages))
+            chunk_size = 0
+            users_messages = []
+    failed_count += send_chunk(interleave(users_messages))
+    logger.info(f'Tasks: Notifications about {len(messages)} tasks sent to {users_count} users, '
+                f'{failed_count} messages failed')
+
+
+def interleave(users_messages):
+    """
+    Orders the messages round-robin over the users: the first message of every
+    user, then the second ones and so on, so the messages of one user are
+    spread over the chunk instead of waiting for their chat one after another.
+    """
+    return [context for contexts in zip_longest(*users_messages) for context in contexts if context is not None]
+
+
+def send_chunk(user_message_contexts):
+    """
+    Sends the messages and waits until they are delivered, so only one chunk
+    is kept in the mailing queue. Returns the number of failed messages.
+    """
+    failed_count = 0
+    for future in mailing_engine.broadcast(user_message_contexts):
+        try:
+            error = future.result()
+        except Exception as ex:
+            logger.error(f'Tasks: Notification error "{str(ex)}"')
+            error = str(ex)
+        if error:
+            failed_count += 1
+    return failed_count
+
+
+def send_tasks_notifications(task_ids):
+    """Runs preparing_tasks_for_send in the notifications thread with its own session."""
+    try:
+        preparing_tasks_for_send(task_ids)
+    except Exception as ex:
+        logger.error(f'Tasks: Notifications error "{str(ex)}"', exc_info=True)
+    finally:
+        db_session.remove()
@@ -1,3 +1,4 @@
+import atexit
 import os
 from functools import lru_cache
 from queue import Queue
@@ -12,10 +13,16 @@ from telegram.ext import (Updater,
                           ConversationHandler,
                           CallbackContext,
                           CallbackQueryHandler,
-                          PicklePersistence, Dispatcher, JobQueue, ExtBot)
+                          Dispatcher, JobQueue, ExtBot, TypeHandler)
 from telegram.utils.request import Request
 
-from app.config import BOT_PERSISTENCE_FILE, HOST_NAME, WEBHOOK_URL, USE_WEBHOOK
+from app.config import (BOT_CON_POOL_SIZE,
+                        BOT_PERSISTENCE_FILE,
+                        BOT_PERSISTENCE_FLUSH_INTERVAL,
+                        HOST_NAME,
+                        UPDATE_QUEUE_SIZE,
+                        WEBHOOK_URL,
+                        USE_WEBHOOK)
 from app.database import db_session
 from app.logger import bot_logger
 from bot import common_comands
@@ -26,6 +33,8 @@ from bot.decorators.logger import log_command
 from bot.handlers.categories_handler import categories_conv, change_user_categories
 from bot.handlers.feedback_handler import feedback_conv
 from bot.handlers.subscription_handler import subscription_conv
+from bot.persistence import DatabasePersistence, flush_persistence, refresh_conversations
+from bot.update_metrics import track_update_latency
 from core.repositories.user_repository import UserRepository
 from core.services.user_service import UserService
 
@@ -74,10 +83,11 @@ def init_pooling(bot, persistence):
 
 
 def init_webhook(bot, persistence, webhook_url):
-    update_queue = Queue()
+    update_queue = Queue(maxsize=UPDATE_QUEUE_SIZE)
     job_queue = JobQueue()
     dispatcher = Dispatcher(bot, update_queue, job_queue=job_queue, persistence=persistence)
     job_queue.set_dispatcher(dispatcher)
+    job_queue.start()
     success_setup = bot.set_webhook(webhook_url)
     if not success_setup:
         logger.error(f'Issue with telegram webhook: {webhook_url}')
@@ -92,13 +102,12 @@ def init_webhook(bot, persistence, webhook_url):
 @lru_cache(maxsize=None)
 def init() -> Dispatcher:
     token = os.getenv('TOKEN')
-    request = Request(con_pool_size=8)
+    request = Request(con_pool_size=BOT_CON_POOL_SIZE)
     bot = ExtBot(token, request=request)
-    bot_persistence = PicklePersistence(filename=BOT_PERSISTENCE_FILE,
-                                        store_bot_data=True,
-                                        store_user_data=True,
-                                        store_callback_data=True,
-                                        store_chat_data=True)
+    bot_persistence = DatabasePersistence()
+    if os.path.exists(BOT_PERSISTENCE_FILE) and bot_persistence.is_empty():
+        bot_persistence.import_pickle(BOT_PERSISTENCE_FILE,
+                                      ['main_handler', 'category_handler', 'feedback_handler', 'subscription_handler'])
 
     if HOST_NAME and USE_WEBHOOK:
         dispatcher = init_webhook(bot, bot_persistence, WEBHOOK_URL)
@@ -131,9 +140,16 @@ def init() -> Dispatcher:
 
     update_users_category = CallbackQueryHandler(change_user_categories, pattern='^up_cat[0-9]{1,2}$')
 
+    dispatcher.add_handler(TypeHandler(Update, refresh_conversations), group=-2)
+    dispatcher.add_handler(TypeHandler(Update, track_update_latency), group=-1)
     dispatcher.add_handler(conv_handler)
     dispatcher.add_handler(update_users_category)
     dispatcher.add_error_handler(error_handler)
+    dispatcher.job_queue.run_repeating(flush_persistence,
+                                       interval=BOT_PERSISTENCE_FLUSH_INTERVAL,
+                                       first=BOT_PERSISTENCE_FLUSH_INTERVAL,
+                                       name='Persistence flush')
+    atexit.register(bot_persistence.flush)
 
     return dispatcher
 
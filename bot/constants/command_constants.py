@@ -1,6 +1,7 @@
 COMMAND__ABOUT = 'about'
 COMMAND__OPEN_MENU = 'open_menu'
 COMMAND__OPEN_TASK = 'open_task'
+COMMAND__MORE_TASKS = 'more_tasks'
 COMMAND__CHANGE_CATEGORY = 'change_category'
 COMMAND__RETURN_CHOSE_CATEGORY = 'return_chose_category'
 COMMAND__READY = 'ready'
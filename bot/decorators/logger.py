@@ -1,30 +1,31 @@
-import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
 
-from app.models import Statistics
-from app.database import db_session
-from datetime import datetime
 from app.logger import bot_logger as logger
+from bot.statistics_writer import statistics_writer
 
+command_logging_suppressed = ContextVar('command_logging_suppressed', default=False)
 
-def log_command(command, ignore_func: list = None):
+
+@contextmanager
+def suppress_command_logging():
+    """Handlers called inside the block are not written to the command statistics."""
+    token = command_logging_suppressed.set(True)
+    try:
+        yield
+    finally:
+        command_logging_suppressed.reset(token)
+
+
+def log_command(command):
     def log(func):
+        @wraps(func)
         def wrapper(*args, **kwargs):
             try:
                 update = args[0]
-                if ignore_func:
-                    current_frame = inspect.currentframe()
-                    caller_frame = current_frame.f_back
-                    code_obj = caller_frame.f_code
-                    code_obj_name = code_obj.co_name
-
-                    if code_obj_name in ignore_func:
-                        return func(*args, **kwargs)
-
-                statistic = Statistics(telegram_id=update.effective_user.id,
-                                       command=command)
-
-                db_session.add(statistic)
-                db_session.commit()
+                if not command_logging_suppressed.get():
+                    statistics_writer.add(update.effective_user.id, command)
                 return func(*args, **kwargs)
             except Exception as ex:
                 logger.error(f"The error {str(ex)} after command: '{command}'")
@@ -1,24 +1,98 @@
-import locale
-locale.setlocale(locale.LC_ALL, 'ru_RU.UTF-8')
+import threading
+from collections import OrderedDict
+
+from app import config
 
 UTM_STAMP = '&utm_source=telegram' \
             '&utm_medium=social' \
             '&utm_campaign=bot_procharity'
 
+MONTHS = ('января', 'февраля', 'марта', 'апреля', 'мая', 'июня',
+          'июля', 'августа', 'сентября', 'октября', 'ноября', 'декабря')
+
+# Notifications and the open tasks feed show the same message
+TEMPLATE_TASK = 'task'
+
+
+class TaskMessageCache:
+    """
+    Rendered task messages keyed by (task_id, content_hash, template), so a task
+    is rendered once however many times it is shown or mailed. A changed task has
+    a new content hash and is rendered again; a renamed category is detected by
+    the category name kept with the message. When there are more than
+    `max_entries` messages, the least recently used ones are evicted.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._messages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, task, template: str) -> str:
+        key = (task.id, task.content_hash, template)
+        with self._lock:
+            cached = self._messages.get(key)
+            if cached is not None and cached[0] == task.category_name:
+                self._messages.move_to_end(key)
+                return cached[1]
+        message = TEMPLATES[template](task)
+        with self._lock:
+            self._messages[key] = (task.category_name, message)
+            self._messages.move_to_end(key)
+            while len(self._messages) > self.max_entries:
+                self._messages.popitem(last=False)
+        return message
+
+    def invalidate(self, task_ids: list[int]) -> None:
+        """Removes the messages of the tasks, whatever their content hash and template."""
+        task_ids = set(task_ids)
+        with self._lock:
+            for key in [key for key in self._messages if key[0] in task_ids]:
+                del self._messages[key]
+
+
+def format_date(day) -> str:
+    """Formats a date like '5 марта 2026' without depending on the process locale."""
+    return f'{day.day} {MONTHS[day.month - 1]} {day.year}'
 
-def display_task(t):
-    return f'<b>{t[0].title}</b>\n\n' \
-           f'От {t[0].name_organization}{", " + str(t[0].location) if t[0].location else ""}\n\n' \
-           f'Бонусы {"💎" * t[0].bonus}\n' \
-           f'Категория: {t[1]}\n' \
-           f'Срок: {t[0].deadline.strftime("%d %B %Y").lstrip("0")}г.\n\n' \
-           f'<u><a href="{t[0].link}{UTM_STAMP}">Посмотреть задание</a></u>'
+
+def display_task(task):
+    return task_message_cache.render(task, TEMPLATE_TASK)
 
 
 def display_task_notification(task):
+    return task_message_cache.render(task, TEMPLATE_TASK)
+
+
+def render_task(task):
     return (f'<b>{task.title}</b>\n\n'
             f'От {task.name_organization}{", " + str(task.location) if task.location else ""}\n\n'
             f'Бонусы {"💎" * task.bonus}\n'
-            f'Категория: {task.categories.name}\n'
-            f'Срок: {task.deadline.strftime("%d %B %Y").lstrip("0")}г.\n\n'
+            f'Категория: {task.category_name}\n'
+            f'Срок: {format_date(task.deadline)}г.\n\n'
             f'<u><a href="{task.link}{UTM_STAMP}">Посмотреть задание</a></u>')
+
+
+TEMPLATES = {
+    TEMPLATE_TASK: render_task,
+}
+
+task_message_cache = TaskMessageCache(config.TASK_MESSAGE_CACHE_SIZE)
+
+
+def display_tasks_digest(messages, limit=4096):
+    """
+    Merges several task messages into as few Telegram messages as possible.
+    Every part stays within the Telegram message length limit.
+    """
+    separator = '\n\n'
+    parts = []
+    current = ''
+    for message in messages:
+        if current and len(current) + len(separator) + len(message) > limit:
+            parts.append(current)
+            current = ''
+        current = f'{current}{separator}{message}' if current else message
+    if current:
+        parts.append(current)
+    return parts
@@ -1,4 +1,5 @@
 import re
+from functools import lru_cache
 
 from telegram import (Update,
                       InlineKeyboardMarkup,
@@ -10,20 +11,18 @@ from telegram.ext import (CallbackContext,
 from telegram import InlineKeyboardButton
 
 from app.database import db_session
-from app.models import Category
 from bot import common_comands
 from bot import formatter
 from bot.constants import constants
 from bot.constants import command_constants
 from bot.constants import states
 from bot.decorators.actions import send_typing_action
-from bot.decorators.logger import log_command
+from bot.decorators.logger import log_command, suppress_command_logging
 from core.repositories.user_repository import UserRepository
+from core.services.category_tree_service import category_tree_service
 from core.services.user_service import UserService
 from bot.handlers.feedback_handler import feedback_conv
 
-from sqlalchemy.orm import load_only
-
 user_repository = UserRepository(db_session)
 user_db = UserService(user_repository)
 
@@ -86,63 +85,57 @@ def change_user_categories(update: Update, context: CallbackContext):
     telegram_id = update.effective_user.id
 
     user_db.change_user_category(telegram_id=telegram_id, category_id=category_id)
-    choose_category(update, context, parent_category_id=category_id)
+    # Tasks of the new categories can be below the last shown id
+    context.user_data.pop(states.START_SHOW_TASK, None)
+    with suppress_command_logging():
+        choose_category(update, context, parent_category_id=category_id)
     update.callback_query.answer()
 
 
-def is_subcategory(category_id):
-    if not category_id:
-        return
-    category = Category.query.options(load_only('id')).filter_by(archive=False).filter_by(id=category_id).first()
-    return True if category.parent_id else False
-
-
-def list_subcategories(category_id):
-    if not category_id:
-        return
-    if is_subcategory(category_id):
-        subcategory_parent_id = Category.query.options(load_only('id'))\
-            .filter_by(archive=False)\
-            .filter_by(id=category_id)\
-            .first().parent_id
-        subcategories = Category.query.options(load_only('id'))\
-            .filter_by(archive=False)\
-            .filter_by(parent_id=subcategory_parent_id).all()
-    else:
-        subcategories = Category.query.options(load_only('id'))\
-            .filter_by(archive=False)\
-            .filter_by(parent_id=category_id).all()
-    return subcategories
+@lru_cache(maxsize=2)
+def get_category_keyboards(tree):
+    """
+    Buttons of every category menu, built once per category tree version.
+    Every item is (category_id, button, selected_button); top level categories can't be selected.
+    """
+    keyboards = {}
+    for parent_id in tree.children:
+        keyboards[parent_id] = []
+        for category in tree.children_of(parent_id):
+            button = InlineKeyboardButton(text=category.name, callback_data=f'up_cat{category.id}')
+            selected_button = button
+            if parent_id:
+                selected_button = InlineKeyboardButton(text=f'{category.name} ✅', callback_data=f'up_cat{category.id}')
+            keyboards[parent_id].append((category.id, button, selected_button))
+    return keyboards
+
+
+def get_category_buttons(tree, parent_category_id, selected_ids):
+    menu_id = None
+    if parent_category_id:
+        category = tree.get_active(parent_category_id)
+        if not category:
+            return []
+        menu_id = category.parent_id or category.id
+    return [
+        [selected_button if category_id in selected_ids else button]
+        for category_id, button, selected_button in get_category_keyboards(tree).get(menu_id, [])
+    ]
 
 
-@log_command(command=constants.LOG_COMMANDS_NAME['choose_category'],
-             ignore_func=['change_user_categories'])
+@log_command(command=constants.LOG_COMMANDS_NAME['choose_category'])
 def choose_category(update: Update, context: CallbackContext, parent_category_id=None, save_prev_msg: bool = False):
     """The main function is to select categories for subscribing to them."""
-    buttons = []
-    categories = user_db.get_categories(update.effective_user.id)
-
-    display_categories = list_subcategories(parent_category_id)
-
-    for category in categories:
-        if category['user_selected']:
-            category['name'] += " ✅"
-        if not parent_category_id:
-            if not category['parent_id']:
-                buttons.append(
-                    [InlineKeyboardButton(text=category['name'], callback_data=f'up_cat{category["category_id"]}')]
-                )
-        else:
-            for c in display_categories:
-                if c.id == category['category_id']:
-                    buttons.append(
-                        [InlineKeyboardButton(text=category['name'], callback_data=f'up_cat{category["category_id"]}')]
-                    )
+    tree = category_tree_service.get_tree()
+    user_category_ids = user_db.get_user_category_ids(update.effective_user.id)
+    buttons = get_category_buttons(tree, parent_category_id, user_category_ids)
 
-    selected_categories_list = [category for category in categories if category['user_selected']]
+    selected_categories_list = [
+        category_id for category_id in user_category_ids if tree.is_subcategory(category_id)
+    ]
 
     if parent_category_id:
-        context.user_data[states.CATEGORIES_SELECTED] = user_db.check_user_category(update.effective_user.id)
+        context.user_data[states.CATEGORIES_SELECTED] = bool(user_category_ids)
         buttons += [
             [
                 InlineKeyboardButton(text='Назад ⬅️',
@@ -150,7 +143,7 @@ def choose_category(update: Update, context: CallbackContext, parent_category_id
             ]]
     elif not selected_categories_list:
         context.user_data[states.SUBSCRIPTION_FLAG] = user_db.set_user_unsubscribed(update.effective_user.id)
-        context.user_data[states.CATEGORIES_SELECTED] = user_db.check_user_category(update.effective_user.id)
+        context.user_data[states.CATEGORIES_SELECTED] = bool(user_category_ids)
         buttons += [
             [
                 InlineKeyboardButton(text='Нет моих компетенций 😕',
@@ -159,7 +152,7 @@ def choose_category(update: Update, context: CallbackContext, parent_category_id
     else:
         if len(selected_categories_list) == 1:
             context.user_data[states.SUBSCRIPTION_FLAG] = user_db.set_user_subscribed(update.effective_user.id)
-            context.user_data[states.CATEGORIES_SELECTED] = user_db.check_user_category(update.effective_user.id)
+            context.user_data[states.CATEGORIES_SELECTED] = bool(user_category_ids)
         buttons += [
             [
                 InlineKeyboardButton(text='Нет моих компетенций 😕',
@@ -248,20 +241,18 @@ def no_relevant_category(update: Update, context: CallbackContext):
 def show_open_task(update: Update, context: CallbackContext):
     buttons = [
         [
-            InlineKeyboardButton(text='Посмотреть ещё', callback_data=command_constants.COMMAND__OPEN_TASK)
+            InlineKeyboardButton(text='Посмотреть ещё', callback_data=command_constants.COMMAND__MORE_TASKS)
         ],
         [common_comands.open_menu_button]
     ]
     keyboard = InlineKeyboardMarkup(buttons)
+    if update.callback_query.data != command_constants.COMMAND__MORE_TASKS:
+        # Opened from the menu or after the categories: the feed starts from the first task
+        context.user_data.pop(states.START_SHOW_TASK, None)
 
-    if not context.user_data.get(states.START_SHOW_TASK):
-        context.user_data[states.START_SHOW_TASK] = []
-
-    tasks = user_db.get_user_active_tasks(
-        update.effective_user.id, context.user_data[states.START_SHOW_TASK]
+    tasks, has_more = user_db.get_user_active_tasks(
+        update.effective_user.id, get_last_shown_task_id(context), PAGINATION
     )
-    if tasks:
-        tasks.sort(key=lambda x: x[0].id)
 
     if not tasks:
         update.callback_query.edit_message_text(
@@ -271,34 +262,23 @@ def show_open_task(update: Update, context: CallbackContext):
             )
         )
     else:
-        for task in tasks[:PAGINATION]:
-            """
-            Это условия проверяет, является ли элемент последним в списке
-            доступных к показу заданий или нет.
-            """
-            if task[0].id != tasks[-1][0].id:
-                context.bot.send_message(
-                    chat_id=update.effective_chat.id, text=formatter.display_task(task),
-                    parse_mode=ParseMode.HTML, disable_web_page_preview=True
-                )
-                context.user_data[states.START_SHOW_TASK].append(task[0].id)
-            else:
-                context.bot.send_message(
-                    chat_id=update.effective_chat.id, text=formatter.display_task(task),
-                    parse_mode=ParseMode.HTML, disable_web_page_preview=True
-                )
-                context.user_data[states.START_SHOW_TASK].append(task[0].id)
-                update.callback_query.delete_message()
-                context.bot.send_message(
-                    chat_id=update.effective_chat.id,
-                    text='Ты просмотрел все открытые задания на текущий момент.',
-                    reply_markup=InlineKeyboardMarkup(
-                        [[common_comands.open_menu_button]]
-                    )
-                )
-                return states.OPEN_TASKS
+        for task in tasks:
+            context.bot.send_message(
+                chat_id=update.effective_chat.id, text=formatter.display_task(task),
+                parse_mode=ParseMode.HTML, disable_web_page_preview=True
+            )
+            context.user_data[states.START_SHOW_TASK] = task.id
 
         update.callback_query.delete_message()
+        if not has_more:
+            context.bot.send_message(
+                chat_id=update.effective_chat.id,
+                text='Ты просмотрел все открытые задания на текущий момент.',
+                reply_markup=InlineKeyboardMarkup(
+                    [[common_comands.open_menu_button]]
+                )
+            )
+            return states.OPEN_TASKS
 
         context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -309,7 +289,19 @@ def show_open_task(update: Update, context: CallbackContext):
     return states.OPEN_TASKS
 
 
-open_tasks_handler = CallbackQueryHandler(show_open_task, pattern=command_constants.COMMAND__OPEN_TASK)
+def get_last_shown_task_id(context: CallbackContext):
+    """Tasks are shown in the order of id, so the last shown id is enough to continue."""
+    last_shown_task_id = context.user_data.get(states.START_SHOW_TASK)
+    if isinstance(last_shown_task_id, list):
+        # Previous versions kept the list of all shown task ids
+        last_shown_task_id = max(last_shown_task_id, default=0)
+        context.user_data[states.START_SHOW_TASK] = last_shown_task_id
+    return last_shown_task_id or 0
+
+
+open_tasks_handler = CallbackQueryHandler(
+    show_open_task, pattern=f'^({command_constants.COMMAND__OPEN_TASK}|{command_constants.COMMAND__MORE_TASKS})$'
+)
 
 categories_conv = ConversationHandler(
     allow_reentry=True,
@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from telegram import Bot, ParseMode
+from telegram.error import BadRequest, NetworkError, RetryAfter, Unauthorized
+
+from app import config
+from app.database import db_session
+from app.logger import bot_logger as logger
+from app.models import User
+
+
+@dataclass
+class SendUserMessageContext:
+    message: str
+    telegram_id: int
+
+
+class TokenBucket:
+    """
+    Global rate limiter shared by all mailing senders.
+    When Telegram answers with RetryAfter the whole bucket is paused,
+    because the flood limit applies to the bot, not to a single chat.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._updated = self._paused_until
+            self._tokens = 0
+
+
+class ChatRateLimiter:
+    """Keeps a minimal interval between two messages sent to the same chat."""
+
+    def __init__(self, interval: float, max_chats: int = 10000) -> None:
+        self.interval = interval
+        self.max_chats = max_chats
+        self._next_allowed = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, chat_id: int) -> float:
+        """Reserves the next free slot of the chat and returns the seconds until it."""
+        with self._lock:
+            now = time.monotonic()
+            if len(self._next_allowed) > self.max_chats:
+                self._next_allowed = {
+                    chat: moment for chat, moment in self._next_allowed.items() if moment > now
+                }
+            send_at = max(now, self._next_allowed.get(chat_id, now))
+            self._next_allowed[chat_id] = send_at + self.interval
+        return send_at - now
+
+
+class DelayedSubmitter:
+    """
+    Submits calls to the executor after a delay from one timer thread,
+    so a message waiting for its chat slot doesn't hold a pool worker.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor) -> None:
+        self.executor = executor
+        self._calls = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, delay: float, function: Callable, *args) -> None:
+        with self._condition:
+            heapq.heappush(self._calls, (time.monotonic() + delay, next(self._counter), function, args))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mailing-delayed', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while not self._calls or self._calls[0][0] > time.monotonic():
+                    self._condition.wait(self._calls[0][0] - time.monotonic() if self._calls else None)
+                _, _, function, args = heapq.heappop(self._calls)
+            self.executor.submit(function, *args)
+
+
+class MailingEngine:
+    """
+    Sends messages with a pool of concurrent senders.
+    Every sender takes a token from the global bucket, so the bot stays within
+    Telegram flood limits. A message whose chat got another one less than
+    `chat_interval` ago is put aside until its slot instead of blocking a sender.
+    """
+
+    def __init__(self, bot: Bot,
+                 rate: float = config.MAILING_RATE_LIMIT,
+                 chat_interval: float = config.MAILING_CHAT_INTERVAL,
+                 workers: int = config.MAILING_WORKERS) -> None:
+        self.bot = bot
+        # No burst: a full bucket plus its refill exceeds the flood limit in the first second
+        self.bucket = TokenBucket(rate, capacity=1)
+        self.chat_limiter = ChatRateLimiter(chat_interval)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mailing')
+        self.delayed = DelayedSubmitter(self.executor)
+
+    def send(self, user_message_context: SendUserMessageContext) -> Future:
+        """
+        Adds the message to the sending pool.
+
+        :param user_message_context: Message and recipient
+        :return: Future with None on success or with the error text
+        """
+        future = Future()
+        self._schedule(user_message_context, future, 1, 0)
+        return future
+
+    def broadcast(self, user_message_contexts: Iterable[SendUserMessageContext]) -> List[Future]:
+        return [self.send(user_message_context) for user_message_context in user_message_contexts]
+
+    def _schedule(self, user_message_context: SendUserMessageContext, future: Future,
+                  attempt: int, delay: float) -> None:
+        """Reserves the chat slot and runs the attempt in it, at least `delay` seconds later."""
+        delay = max(delay, self.chat_limiter.reserve(user_message_context.telegram_id))
+        if delay > 0:
+            self.delayed.submit(delay, self._run_attempt, user_message_context, future, attempt)
+        else:
+            self.executor.submit(self._run_attempt, user_message_context, future, attempt)
+
+    def _run_attempt(self, user_message_context: SendUserMessageContext, future: Future, attempt: int) -> None:
+        try:
+            retry_delay, error_message = self.deliver(user_message_context, attempt)
+        except Exception as ex:
+            future.set_exception(ex)
+            return
+        if retry_delay is None:
+            future.set_result(error_message)
+        else:
+            self._schedule(user_message_context, future, attempt + 1, retry_delay)
+
+    def deliver(self, user_message_context: SendUserMessageContext,
+                attempt: int) -> Tuple[Optional[float], Optional[str]]:
+        """
+        Makes one attempt to send the message.
+
+        :return: Delay before the next attempt or None when there is no next
+            attempt, and the error text or None on success
+        """
+        telegram_id = user_message_context.telegram_id
+        self.bucket.acquire()
+        try:
+            self.bot.send_message(
+                chat_id=telegram_id,
+                text=user_message_context.message,
+                parse_mode=ParseMode.HTML,
+                disable_web_page_preview=True
+            )
+            logger.info(f'Sent message to {telegram_id}')
+            return None, None
+        except RetryAfter as ex:
+            logger.info(f'Mailing: flood limit reached, pause for {ex.retry_after} seconds')
+            self.bucket.pause(ex.retry_after)
+            error_message = str(ex.message)
+            retry_delay = 0
+        except BadRequest as ex:
+            logger.error(f'{str(ex.message)}, telegram_id: {telegram_id}')
+            return None, str(ex.message)
+        except Unauthorized as ex:
+            logger.error(f'{str(ex.message)}: {telegram_id}')
+            User.query.filter_by(
+                telegram_id=telegram_id
+            ).update({'banned': True, 'has_mailing': False})
+            db_session.commit()
+            return None, str(ex.message)
+        except NetworkError as ex:
+            logger.error(f'{str(ex.message)}, telegram_id: {telegram_id}')
+            error_message = str(ex.message)
+            retry_delay = attempt
+        if attempt < config.MAILING_TRIES:
+            logger.info(f'Retry to send after {retry_delay}')
+            return retry_delay, error_message
+        return None, error_message
@@ -0,0 +1,134 @@
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, bindparam, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from telegram.ext import CallbackContext
+
+from app import config
+from app.database import db_session
+from app.logger import bot_logger as logger
+from app.models import Notification, NotificationOutbox
+from bot.mailing import SendUserMessageContext
+from bot.messages import mailing_engine
+
+STATUS_QUEUED = 'queued'
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+outbox_lock = threading.Lock()
+
+
+def process_outbox(context: CallbackContext) -> None:
+    """
+    Job callback: delivers the notifications outbox batch by batch until
+    nothing is left to claim. Several processes can run it at once,
+    rows are claimed with FOR UPDATE SKIP LOCKED.
+    """
+    if not outbox_lock.acquire(blocking=False):
+        return
+    try:
+        while deliver_batch(config.OUTBOX_BATCH_SIZE):
+            pass
+    except SQLAlchemyError as ex:
+        logger.error(f'Outbox: Database error "{str(ex)}"')
+        db_session.rollback()
+    finally:
+        outbox_lock.release()
+        db_session.remove()
+
+
+def claim_batch(size):
+    """
+    Marks up to `size` queued rows as sending and returns them. Rows left
+    in the sending state by a crashed worker are claimed again after
+    OUTBOX_CLAIM_TIMEOUT seconds.
+    """
+    now = datetime.now()
+    stale_date = now - timedelta(seconds=config.OUTBOX_CLAIM_TIMEOUT)
+    claimable = select(NotificationOutbox.id).where(
+        or_(NotificationOutbox.status == STATUS_QUEUED,
+            and_(NotificationOutbox.status == STATUS_SENDING,
+                 NotificationOutbox.claimed_date < stale_date))
+    ).order_by(NotificationOutbox.id).limit(size).with_for_update(skip_locked=True)
+
+    rows = db_session.execute(
+        update(NotificationOutbox.__table__)
+        .where(NotificationOutbox.id.in_(claimable.scalar_subquery()))
+        .values(status=STATUS_SENDING,
+                claimed_date=now,
+                attempts=NotificationOutbox.attempts + 1)
+        .returning(NotificationOutbox.id,
+                   NotificationOutbox.notification_id,
+                   NotificationOutbox.telegram_id,
+                   NotificationOutbox.attempts)
+    ).all()
+    db_session.commit()
+    return rows
+
+
+def deliver_batch(size):
+    rows = claim_batch(size)
+    if not rows:
+        return False
+
+    notification_ids = {row.notification_id for row in rows}
+    messages = dict(db_session.execute(
+        select(Notification.id, Notification.message).where(Notification.id.in_(notification_ids))
+    ).all())
+
+    results = []
+    futures = []
+    for row in rows:
+        if row.attempts > config.OUTBOX_MAX_ATTEMPTS:
+            results.append((row, 'Too many delivery attempts'))
+            continue
+        future = mailing_engine.send(
+            SendUserMessageContext(message=messages[row.notification_id], telegram_id=row.telegram_id)
+        )
+        futures.append((row, future))
+    for row, future in futures:
+        try:
+            results.append((row, future.result()))
+        except Exception as ex:
+            results.append((row, str(ex)))
+
+    save_results(results)
+    return True
+
+
+def save_results(results):
+    db_session.execute(
+        update(NotificationOutbox.__table__)
+        .where(NotificationOutbox.id == bindparam('row_id'))
+        .values(status=bindparam('new_status'), last_error=bindparam('error')),
+        [
+            {'row_id': row.id,
+             'new_status': STATUS_FAILED if error else STATUS_SENT,
+             'error': error[:256] if error else None}
+            for row, error in results
+        ]
+    )
+
+    sent = Counter(row.notification_id for row, error in results if not error)
+    failed = Counter(row.notification_id for row, error in results if error)
+    for notification_id in set(sent) | set(failed):
+        db_session.execute(
+            update(Notification)
+            .where(Notification.id == notification_id)
+            .values(sent_count=Notification.sent_count + sent[notification_id],
+                    failed_count=Notification.failed_count + failed[notification_id])
+            .execution_options(synchronize_session=False)
+        )
+    db_session.execute(
+        update(Notification)
+        .where(Notification.id.in_(set(sent) | set(failed)),
+               Notification.was_sent.is_not(True),
+               Notification.sent_count + Notification.failed_count >= Notification.queued_count)
+        .values(was_sent=True, sent_date=datetime.now())
+        .execution_options(synchronize_session=False)
+    )
+    db_session.commit()
+    logger.info(f'Outbox: Sent {sum(sent.values())}, failed {sum(failed.values())} messages')
@@ -0,0 +1,285 @@
+import json
+import threading
+from collections import defaultdict
+from copy import deepcopy
+from typing import DefaultDict, Dict, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
+from telegram import Chat, Update, User
+from telegram.ext import BasePersistence, CallbackContext, PicklePersistence
+from telegram.ext.utils.types import CDCData, ConversationDict
+
+from app.database import engine
+from app.logger import bot_logger as logger
+from app.models import BotPersistence
+
+USER_DATA = 'user_data'
+CHAT_DATA = 'chat_data'
+BOT_DATA = 'bot_data'
+CALLBACK_DATA = 'callback_data'
+CONVERSATION = 'conversation:'
+
+
+class DatabasePersistence(BasePersistence):
+    """
+    Keeps the bot, chat, user, callback and conversation data in the bot_persistence
+    table, one JSONB row per (kind, key). Data is changed in memory, only the
+    rows changed since the previous flush are written, with one batched upsert.
+    Every process writes only its own changes row by row, so processes don't
+    overwrite the whole state of each other. Before an update is handled, the
+    rows of its chat and user are read again (refresh_* methods and the
+    refresh_conversations handler), so a process continues from the state
+    saved by another one.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(store_user_data=True,
+                         store_chat_data=True,
+                         store_bot_data=True,
+                         store_callback_data=True)
+        self.user_data: Optional[DefaultDict[int, dict]] = None
+        self.chat_data: Optional[DefaultDict[int, dict]] = None
+        self.bot_data: Optional[dict] = None
+        self.callback_data: Optional[CDCData] = None
+        self.conversations: Dict[str, Dict[Tuple, object]] = {}
+        self._dirty = set()
+        self._lock = threading.RLock()
+
+    def get_user_data(self) -> DefaultDict[int, dict]:
+        with self._lock:
+            if self.user_data is None:
+                self.user_data = defaultdict(dict, {int(key): data for key, data in self._load(USER_DATA)})
+            return deepcopy(self.user_data)
+
+    def get_chat_data(self) -> DefaultDict[int, dict]:
+        with self._lock:
+            if self.chat_data is None:
+                self.chat_data = defaultdict(dict, {int(key): data for key, data in self._load(CHAT_DATA)})
+            return deepcopy(self.chat_data)
+
+    def get_bot_data(self) -> dict:
+        with self._lock:
+            if self.bot_data is None:
+                self.bot_data = dict(self._load(BOT_DATA)).get('', {})
+            return deepcopy(self.bot_data)
+
+    def get_callback_data(self) -> Optional[CDCData]:
+        with self._lock:
+            if self.callback_data is None:
+                data = dict(self._load(CALLBACK_DATA)).get('')
+                if data is None:
+                    return None
+                keyboards, buttons = data
+                self.callback_data = ([tuple(keyboard) for keyboard in keyboards], buttons)
+            return deepcopy(self.callback_data)
+
+    def get_conversations(self, name: str) -> ConversationDict:
+        """
+        Returns the dict the ConversationHandler keeps, not a copy, so the
+        states refreshed by refresh_conversations are seen by the handler.
+        """
+        with self._lock:
+            if name not in self.conversations:
+                self.conversations[name] = {
+                    tuple(json.loads(key)): data['state'] for key, data in self._load(CONVERSATION + name)
+                }
+            return self.conversations[name]
+
+    def update_conversation(self, name: str, key: Tuple[int, ...], new_state: Optional[object]) -> None:
+        # The handler has already changed the shared dict, the row is written anyway
+        with self._lock:
+            conversations = self.conversations.setdefault(name, {})
+            if new_state is None:
+                conversations.pop(key, None)
+            else:
+                conversations[key] = new_state
+            self._dirty.add((CONVERSATION + name, json.dumps(list(key))))
+
+    def update_user_data(self, user_id: int, data: dict) -> None:
+        with self._lock:
+            if self.user_data is None:
+                self.user_data = defaultdict(dict)
+            if self.user_data.get(user_id) == data:
+                return
+            self.user_data[user_id] = deepcopy(data)
+            self._dirty.add((USER_DATA, str(user_id)))
+
+    def update_chat_data(self, chat_id: int, data: dict) -> None:
+        with self._lock:
+            if self.chat_data is None:
+                self.chat_data = defaultdict(dict)
+            if self.chat_data.get(chat_id) == data:
+                return
+            self.chat_data[chat_id] = deepcopy(data)
+            self._dirty.add((CHAT_DATA, str(chat_id)))
+
+    def update_bot_data(self, data: dict) -> None:
+        with self._lock:
+            if self.bot_data == data:
+                return
+            self.bot_data = deepcopy(data)
+            self._dirty.add((BOT_DATA, ''))
+
+    def update_callback_data(self, data: CDCData) -> None:
+        with self._lock:
+            if self.callback_data == data:
+                return
+            self.callback_data = deepcopy(data)
+            self._dirty.add((CALLBACK_DATA, ''))
+
+    def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        data = self._refresh(USER_DATA, str(user_id))
+        if data is not None:
+            with self._lock:
+                user_data.clear()
+                user_data.update(data)
+                self.user_data[user_id] = deepcopy(data)
+
+    def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        data = self._refresh(CHAT_DATA, str(chat_id))
+        if data is not None:
+            with self._lock:
+                chat_data.clear()
+                chat_data.update(data)
+                self.chat_data[chat_id] = deepcopy(data)
+
+    def refresh_bot_data(self, bot_data: dict) -> None:
+        data = self._refresh(BOT_DATA, '')
+        if data is not None:
+            with self._lock:
+                bot_data.clear()
+                bot_data.update(data)
+                self.bot_data = deepcopy(data)
+
+    def refresh_conversations(self, chat: Optional[Chat], user: Optional[User]) -> None:
+        """
+        Reads again the conversation states which can belong to the chat and
+        the user: keys (chat_id, user_id), (chat_id) and (user_id). States
+        changed by this process and not flushed yet are kept.
+        """
+        ids = [entity.id for entity in (chat, user) if entity is not None]
+        keys = {json.dumps(ids)} | {json.dumps([entity_id]) for entity_id in ids}
+        with self._lock:
+            kinds = [CONVERSATION + name for name in self.conversations]
+        if not kinds or not ids:
+            return
+        with engine.connect() as connection:
+            rows = connection.execute(
+                select(BotPersistence.kind, BotPersistence.key, BotPersistence.data)
+                .where(BotPersistence.kind.in_(kinds), BotPersistence.key.in_(keys))
+            ).all()
+        states = {(row.kind, row.key): row.data['state'] for row in rows}
+        with self._lock:
+            for kind in kinds:
+                conversations = self.conversations[kind[len(CONVERSATION):]]
+                for key in keys:
+                    conversation_key = tuple(json.loads(key))
+                    if (kind, key) in self._dirty or isinstance(conversations.get(conversation_key), tuple):
+                        continue
+                    if (kind, key) in states:
+                        conversations[conversation_key] = states[kind, key]
+                    else:
+                        conversations.pop(conversation_key, None)
+
+    def flush(self) -> None:
+        """Writes the rows changed since the previous flush."""
+        with self._lock:
+            dirty = self._dirty
+            self._dirty = set()
+            rows = [{'kind': kind, 'key': key, 'data': self._get_value(kind, key)} for kind, key in dirty]
+        if not rows:
+            return
+
+        changed = [row for row in rows if row['data'] is not None and is_serializable(row)]
+        removed = [(row['kind'], row['key']) for row in rows if row['data'] is None]
+        try:
+            with engine.begin() as connection:
+                if changed:
+                    # executemany, psycopg2 sends the rows in pages of multi-row VALUES
+                    query = insert(BotPersistence.__table__)
+                    connection.execute(query.on_conflict_do_update(
+                        index_elements=[BotPersistence.kind, BotPersistence.key],
+                        set_={'data': query.excluded.data, 'updated_date': func.current_timestamp()}
+                    ), changed)
+                if removed:
+                    connection.execute(delete(BotPersistence.__table__).where(
+                        tuple_(BotPersistence.kind, BotPersistence.key).in_(removed)
+                    ))
+        except SQLAlchemyError as ex:
+            logger.error(f'Persistence: Flush of {len(rows)} rows failed "{str(ex)}"')
+            with self._lock:
+                self._dirty |= dirty
+            return
+        logger.debug(f'Persistence: Flushed {len(changed)} rows, removed {len(removed)} rows')
+
+    def is_empty(self) -> bool:
+        with engine.connect() as connection:
+            return connection.execute(select(BotPersistence.kind).limit(1)).first() is None
+
+    def import_pickle(self, filename: str, conversation_names: list[str]) -> None:
+        """Copies the data of a PicklePersistence file into the table."""
+        pickle_persistence = PicklePersistence(filename=filename, store_callback_data=True)
+        with self._lock:
+            self.user_data = pickle_persistence.get_user_data()
+            self.chat_data = pickle_persistence.get_chat_data()
+            self.bot_data = pickle_persistence.get_bot_data()
+            self.callback_data = pickle_persistence.get_callback_data()
+            self._dirty |= {(USER_DATA, str(user_id)) for user_id in self.user_data}
+            self._dirty |= {(CHAT_DATA, str(chat_id)) for chat_id in self.chat_data}
+            self._dirty |= {(BOT_DATA, ''), (CALLBACK_DATA, '')}
+            for name in conversation_names:
+                self.conversations[name] = pickle_persistence.get_conversations(name)
+                self._dirty |= {(CONVERSATION + name, json.dumps(list(key))) for key in self.conversations[name]}
+        self.flush()
+        logger.info(f'Persistence: Imported {filename}')
+
+    def _get_value(self, kind: str, key: str) -> Optional[object]:
+        if kind == USER_DATA:
+            return deepcopy(self.user_data.get(int(key)))
+        if kind == CHAT_DATA:
+            return deepcopy(self.chat_data.get(int(key)))
+        if kind == BOT_DATA:
+            return deepcopy(self.bot_data)
+        if kind == CALLBACK_DATA:
+            return deepcopy(self.callback_data)
+        state = self.conversations[kind[len(CONVERSATION):]].get(tuple(json.loads(key)))
+        if isinstance(state, tuple):
+            # (old state, Promise) of a run_async handler, the new state is saved once it is resolved
+            state = state[0]
+        return None if state is None else {'state': state}
+
+    def _refresh(self, kind: str, key: str) -> Optional[dict]:
+        """Returns the saved data of the row or None if it is absent or changed by this process."""
+        with self._lock:
+            if (kind, key) in self._dirty:
+                return None
+        with engine.connect() as connection:
+            query = select(BotPersistence.data).where(BotPersistence.kind == kind, BotPersistence.key == key)
+            return connection.execute(query).scalar()
+
+    def _load(self, kind: str) -> list[tuple[str, object]]:
+        with engine.connect() as connection:
+            query = select(BotPersistence.key, BotPersistence.data).where(BotPersistence.kind == kind)
+            return connection.execute(query).all()
+
+
+def is_serializable(row: dict) -> bool:
+    try:
+        json.dumps(row['data'])
+    except (TypeError, ValueError) as ex:
+        logger.error(f'Persistence: {row["kind"]} {row["key"]} is not saved, "{str(ex)}"')
+        return False
+    return True
+
+
+def refresh_conversations(update: object, context: CallbackContext) -> None:
+    """Handler of the -2 group: reloads the conversation states of the update before they are checked."""
+    if isinstance(update, Update):
+        context.dispatcher.persistence.refresh_conversations(update.effective_chat, update.effective_user)
+
+
+def flush_persistence(context: CallbackContext) -> None:
+    """Job callback: writes the persistence changes made since the previous run."""
+    context.dispatcher.persistence.flush()
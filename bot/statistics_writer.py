@@ -0,0 +1,95 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+
+from app import config
+from app.database import engine
+from app.logger import bot_logger as logger
+from app.models import Statistics
+
+
+class StatisticsWriter:
+    """
+    Buffers command statistics in memory and writes them from a background
+    thread with one multi-row INSERT per batch. A batch is written when it has
+    `batch_size` events or `flush_interval` milliseconds after its first event.
+    At most `max_size` events are buffered, new events are dropped when the
+    database can't keep up.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: int, max_size: int) -> None:
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval / 1000
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stopped = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.dropped = 0
+
+    def add(self, telegram_id: int, command: str) -> None:
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((telegram_id, command, datetime.now()))
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped % self.batch_size == 1:
+                logger.warning(f'Statistics: Buffer is full, {self.dropped} events dropped')
+
+    def close(self) -> None:
+        """Stops the background thread and writes everything left in the buffer."""
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        self._write(batch)
+
+    def _ensure_started(self) -> None:
+        if self._thread:
+            return
+        with self._start_lock:
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, name='statistics-writer', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: list[tuple]) -> None:
+        if not batch:
+            return
+        values = [
+            {'telegram_id': telegram_id, 'command': command, 'added_date': added_date}
+            for telegram_id, command, added_date in batch
+        ]
+        try:
+            with engine.begin() as connection:
+                connection.execute(insert(Statistics.__table__).values(values))
+        except SQLAlchemyError as ex:
+            logger.error(f'Statistics: {len(batch)} events are lost, database error "{str(ex)}"')
+
+
+statistics_writer = StatisticsWriter(batch_size=config.STATISTICS_BATCH_SIZE,
+                                     flush_interval=config.STATISTICS_FLUSH_INTERVAL,
+                                     max_size=config.STATISTICS_BUFFER_SIZE)
@@ -0,0 +1,67 @@
+import threading
+import time
+from collections import deque
+from queue import Queue
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import CallbackContext
+
+
+class UpdateQueueMetrics:
+    """
+    Backpressure metrics of the webhook update queue: the number of enqueued,
+    rejected and handled updates and the enqueue-to-handle latency of the last
+    `window` updates.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.enqueued = 0
+        self.rejected = 0
+        self.handled = 0
+        self._enqueued_at = {}
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def on_enqueued(self, update: Update) -> None:
+        with self._lock:
+            self.enqueued += 1
+            self._enqueued_at[update.update_id] = time.monotonic()
+
+    def on_rejected(self, update: Update) -> None:
+        with self._lock:
+            self.enqueued -= 1
+            self.rejected += 1
+            self._enqueued_at.pop(update.update_id, None)
+
+    def on_handled(self, update: Update) -> None:
+        with self._lock:
+            enqueued_at = self._enqueued_at.pop(update.update_id, None)
+            if enqueued_at is None:
+                # Updates received through polling are not enqueued by the webhook
+                return
+            self.handled += 1
+            self._latencies.append(time.monotonic() - enqueued_at)
+
+    def get_metrics(self, update_queue: Optional[Queue]) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            metrics = dict(enqueued=self.enqueued, rejected=self.rejected, handled=self.handled)
+        metrics['queue_depth'] = update_queue.qsize() if update_queue is not None else None
+        metrics['queue_size'] = update_queue.maxsize if update_queue is not None else None
+        if latencies:
+            metrics['latency_ms'] = dict(avg=round(sum(latencies) / len(latencies) * 1000, 1),
+                                         p95=round(latencies[int(len(latencies) * 0.95)] * 1000, 1),
+                                         max=round(latencies[-1] * 1000, 1))
+        else:
+            metrics['latency_ms'] = None
+        return metrics
+
+
+update_queue_metrics = UpdateQueueMetrics(window=1000)
+
+
+def track_update_latency(update: object, context: CallbackContext) -> None:
+    """Handler of the -1 group: records the time the update waited in the queue."""
+    if isinstance(update, Update):
+        update_queue_metrics.on_handled(update)
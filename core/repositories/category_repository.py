@@ -1,11 +1,15 @@
 from flask import jsonify, make_response
+from sqlalchemy import Integer, all_, literal, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.engine import Row
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import load_only, Session
+from sqlalchemy.orm import Session
 
 from typing import Optional
 
 from app.logger import webhooks_logger as logger
 from app.models import Category
+from app.request_models.category import CategoryCreateRequest
 from core.repositories.abstract_repository import AbstractRepository
 
 
@@ -23,9 +27,10 @@ class CategoryRepository(AbstractRepository):
             raise LookupError(f'Category ID={category_id} not found')
         return category
 
-    def get_all_categories(self) -> list[Category]:
-        categories = Category.query.options(load_only('archive')).all()
-        return categories
+    def get_content_hashes(self) -> dict[int, Row]:
+        """Returns (content_hash, archive) of all categories with one narrow query."""
+        query = select(Category.id, Category.content_hash, Category.archive)
+        return {category.id: category for category in self.session.execute(query)}
 
     def create(self, category: Category) -> Category:
         self.session.add(category)
@@ -38,16 +43,44 @@ class CategoryRepository(AbstractRepository):
         logger.info('Add New Category: New categories successfully added.')
         return category
 
-    def update_categories(self, categories: list[Category]) -> str:
-        self.session.add_all(categories)
-        try:
-            self.session.commit()
-        except SQLAlchemyError as ex:
-            logger.error(f'Categories: Database commit error "{str(ex)}"')
-            self.session.rollback()
-            return make_response(jsonify(message=f'Bad request: {str(ex)}'), 400)
-        logger.info('Categories: New categories successfully added.')
-        return make_response(jsonify(result='ok'), 200)
+    def archive_missing(self, category_ids: list[int]) -> list[int]:
+        """Archives every active category which is absent from category_ids and returns their ids."""
+        query = update(Category.__table__).where(
+            Category.archive.is_(False),
+            Category.id != all_(literal(category_ids, ARRAY(Integer)))
+        ).values(archive=True).returning(Category.id)
+        return list(self.session.execute(query).scalars())
+
+    def upsert(self, categories: list[CategoryCreateRequest]) -> list[Row]:
+        """
+        Inserts new categories and updates the archived or changed ones
+        with a single INSERT ... ON CONFLICT DO UPDATE.
+        Returns (id, inserted) for every written row.
+        """
+        if not categories:
+            return []
+        values = [
+            {'id': category.id,
+             'name': category.name,
+             'parent_id': category.parent_id,
+             'content_hash': category.content_hash(),
+             'archive': False}
+            for category in categories
+        ]
+        query = insert(Category.__table__).values(values)
+        excluded = query.excluded
+        query = query.on_conflict_do_update(
+            index_elements=[Category.id],
+            set_={'name': excluded.name,
+                  'parent_id': excluded.parent_id,
+                  'content_hash': excluded.content_hash,
+                  'archive': False},
+            where=or_(
+                Category.archive.is_(True),
+                Category.content_hash.is_distinct_from(excluded.content_hash)
+            )
+        ).returning(Category.id, literal_column('xmax = 0').label('inserted'))
+        return self.session.execute(query).all()
 
     def update(self, category: Category) -> Category:
         self.session.add(category)
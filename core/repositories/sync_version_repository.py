@@ -0,0 +1,41 @@
+from typing import Optional
+
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models import SyncVersion
+from core.repositories.abstract_repository import AbstractRepository
+
+
+class SyncVersionRepository(AbstractRepository):
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get_or_none(self, name: str) -> Optional[SyncVersion]:
+        return self.session.get(SyncVersion, name)
+
+    def get(self, name: str) -> SyncVersion:
+        sync_version = self.get_or_none(name)
+        if not sync_version:
+            raise LookupError(f'Sync version {name} not found')
+        return sync_version
+
+    def lock(self, name: str) -> SyncVersion:
+        """Returns the version row locked with FOR UPDATE, the row is created on first use."""
+        self.session.execute(
+            insert(SyncVersion.__table__).values(name=name).on_conflict_do_nothing()
+        )
+        return self.session.query(SyncVersion).filter_by(name=name).with_for_update().populate_existing().one()
+
+    def create(self, sync_version: SyncVersion) -> SyncVersion:
+        self.session.add(sync_version)
+        self.session.commit()
+        self.session.refresh(sync_version)
+        return sync_version
+
+    def update(self, sync_version: SyncVersion) -> SyncVersion:
+        self.session.add(sync_version)
+        self.session.commit()
+        self.session.refresh(sync_version)
+        return sync_version
@@ -0,0 +1,139 @@
+from typing import Iterator, Optional
+
+from sqlalchemy import Integer, all_, any_, cast, false, literal, literal_column, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.models import Category, Task, User, Users_Categories
+from app.request_models.task import TaskCreateRequest
+from core.repositories.abstract_repository import AbstractRepository
+
+TASK_FIELDS = ('title', 'name_organization', 'deadline', 'category_id',
+               'bonus', 'location', 'link', 'description', 'content_hash')
+
+
+class TaskRepository(AbstractRepository):
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get_or_none(self, task_id: int) -> Optional[Task]:
+        return self.session.get(Task, task_id)
+
+    def get(self, task_id: int) -> Task:
+        task = self.get_or_none(task_id)
+        if not task:
+            raise LookupError(f'Task ID={task_id} not found')
+        return task
+
+    def create(self, task: Task) -> Task:
+        self.session.add(task)
+        self.session.commit()
+        self.session.refresh(task)
+        return task
+
+    def update(self, task: Task) -> Task:
+        self.session.add(task)
+        self.session.commit()
+        self.session.refresh(task)
+        return task
+
+    def get_tasks_with_category(self, task_ids: list[int]) -> list[Row]:
+        """Returns the task columns shown to users together with the category name."""
+        query = select(
+            Task.id, Task.title, Task.name_organization, Task.location,
+            Task.bonus, Task.deadline, Task.link, Task.content_hash,
+            Category.name.label('category_name')
+        ).join(Category, Category.id == Task.category_id).where(Task.id.in_(task_ids))
+        return self.session.execute(query).all()
+
+    def iter_task_recipients(self, task_ids: list[int], chunk_size: int) -> Iterator[list[Row]]:
+        """
+        Streams (task_id, telegram_id) pairs of the subscribed users for the tasks
+        in chunks. Pairs are ordered by telegram_id, so all tasks of one user are adjacent.
+        """
+        query = select(
+            Task.id.label('task_id'), User.telegram_id
+        ).join(
+            Users_Categories, Users_Categories.category_id == Task.category_id
+        ).join(
+            User, User.telegram_id == Users_Categories.telegram_id
+        ).where(
+            Task.id.in_(task_ids),
+            User.has_mailing.is_(True),
+            User.banned.is_(False)
+        ).order_by(User.telegram_id, Task.id)
+        result = self.session.execute(query.execution_options(stream_results=True))
+        yield from result.partitions(chunk_size)
+
+    def get_content_hashes(self, task_ids: list[int]) -> dict[int, Row]:
+        """Returns (content_hash, archive) of the known tasks with one narrow query."""
+        query = select(Task.id, Task.content_hash, Task.archive).where(
+            Task.id == any_(literal(task_ids, ARRAY(Integer)))
+        )
+        return {task.id: task for task in self.session.execute(query)}
+
+    def archive_missing(self, task_ids: list[int]) -> list[int]:
+        """Archives every active task which is absent from task_ids and returns their ids."""
+        query = update(Task.__table__).where(
+            Task.archive.is_(False),
+            Task.id != all_(literal(task_ids, ARRAY(Integer)))
+        ).values(
+            archive=True, updated_date=func.current_timestamp()
+        ).returning(Task.id)
+        return list(self.session.execute(query).scalars())
+
+    def archive(self, task_ids: list[int]) -> list[int]:
+        """Archives the listed active tasks and returns their ids."""
+        if not task_ids:
+            return []
+        query = update(Task.__table__).where(
+            Task.archive.is_(False),
+            Task.id == any_(literal(task_ids, ARRAY(Integer)))
+        ).values(
+            archive=True, updated_date=func.current_timestamp()
+        ).returning(Task.id)
+        return list(self.session.execute(query).scalars())
+
+    def upsert(self, tasks: list[TaskCreateRequest]) -> list[Row]:
+        """
+        Inserts new tasks and updates the archived or changed ones with a single
+        INSERT ... ON CONFLICT DO UPDATE. Active tasks with the same content hash
+        are left untouched.
+        Returns (id, inserted) for every written row.
+        """
+        values = {
+            'id': [task.id for task in tasks],
+            'title': [task.title for task in tasks],
+            'name_organization': [task.name_organization for task in tasks],
+            'deadline': [task.deadline for task in tasks],
+            'category_id': [task.category_id for task in tasks],
+            'bonus': [task.bonus for task in tasks],
+            'location': [task.location for task in tasks],
+            'link': [str(task.link) for task in tasks],
+            'description': [task.description for task in tasks],
+            'content_hash': [task.content_hash() for task in tasks],
+        }
+        # One array per column instead of a VALUES row per task: the statement is
+        # the same for any number of tasks, so SQLAlchemy compiles it only once
+        rows = select(
+            *[func.unnest(cast(literal(column_values, ARRAY(Task.__table__.c[column].type)),
+                               ARRAY(Task.__table__.c[column].type))).label(column)
+              for column, column_values in values.items()],
+            false().label('archive')
+        )
+        query = insert(Task.__table__).from_select([*values, 'archive'], rows)
+        excluded = query.excluded
+        query = query.on_conflict_do_update(
+            index_elements=[Task.id],
+            set_={**{field: getattr(excluded, field) for field in TASK_FIELDS},
+                  'archive': False,
+                  'updated_date': func.current_timestamp()},
+            where=or_(
+                Task.archive.is_(True),
+                Task.content_hash.is_distinct_from(excluded.content_hash)
+            )
+        ).returning(Task.id, literal_column('xmax = 0').label('inserted'))
+        return self.session.execute(query).all()
@@ -0,0 +1,111 @@
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import config
+from app.database import db_session
+from app.logger import bot_logger as logger
+from app.models import Category, SyncVersion
+
+
+@dataclass(frozen=True)
+class CategoryNode:
+    id: int
+    name: str
+    parent_id: Optional[int]
+    archive: bool
+
+
+class CategoryTree:
+    """
+    Immutable snapshot of all categories with the parent -> active children index.
+    A new tree is built for every change, readers never see a half-built tree.
+    """
+
+    def __init__(self, version: int, nodes: list[CategoryNode]) -> None:
+        children = {}
+        for node in nodes:
+            if not node.archive:
+                children.setdefault(node.parent_id, []).append(node.id)
+        self.version = version
+        self.nodes: Mapping[int, CategoryNode] = MappingProxyType({node.id: node for node in nodes})
+        self.children: Mapping[Optional[int], tuple[int, ...]] = MappingProxyType(
+            {parent_id: tuple(child_ids) for parent_id, child_ids in children.items()}
+        )
+
+    def get_active(self, category_id: int) -> Optional[CategoryNode]:
+        node = self.nodes.get(category_id)
+        if node is None or node.archive:
+            return None
+        return node
+
+    def active_categories(self) -> list[CategoryNode]:
+        return [node for node in self.nodes.values() if not node.archive]
+
+    def children_of(self, parent_id: Optional[int]) -> list[CategoryNode]:
+        return [self.nodes[child_id] for child_id in self.children.get(parent_id, ())]
+
+    def is_subcategory(self, category_id: int) -> bool:
+        node = self.get_active(category_id)
+        return bool(node and node.parent_id)
+
+    def list_subcategories(self, category_id: int) -> list[CategoryNode]:
+        """Returns children of a parent category or siblings of a subcategory."""
+        node = self.get_active(category_id)
+        if node is None:
+            return []
+        return self.children_of(node.parent_id if node.parent_id else node.id)
+
+
+class CategoryTreeService:
+    """
+    Keeps the category tree of the process in memory. The tree is rebuilt
+    after the categories webhook commits; other processes notice the change by
+    the `categories` sync version, which is checked at most once per
+    CATEGORY_TREE_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self._tree: Optional[CategoryTree] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get_tree(self) -> CategoryTree:
+        tree = self._tree
+        if tree is not None and time.monotonic() - self._checked_at < config.CATEGORY_TREE_CHECK_INTERVAL:
+            return tree
+        with self._lock:
+            if self._tree is not None and self._tree.version == self._get_version():
+                self._checked_at = time.monotonic()
+                return self._tree
+            return self._build()
+
+    def reload(self) -> CategoryTree:
+        with self._lock:
+            return self._build()
+
+    def _get_version(self) -> int:
+        query = select(SyncVersion.version).where(SyncVersion.name == SyncVersion.CATEGORIES)
+        return self.session.execute(query).scalar() or 0
+
+    def _build(self) -> CategoryTree:
+        # The version is read first: a change committed in between only causes one more rebuild.
+        version = self._get_version()
+        query = select(Category.id, Category.name, Category.parent_id, Category.archive).order_by(Category.id)
+        nodes = [
+            CategoryNode(id=row.id, name=row.name, parent_id=row.parent_id, archive=bool(row.archive))
+            for row in self.session.execute(query)
+        ]
+        self._tree = CategoryTree(version, nodes)
+        self._checked_at = time.monotonic()
+        logger.info(f'Categories: Category tree version {version} loaded, {len(nodes)} categories')
+        return self._tree
+
+
+category_tree_service = CategoryTreeService(db_session)
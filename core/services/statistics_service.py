@@ -0,0 +1,203 @@
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import Date, cast, delete, func, insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from telegram.ext import CallbackContext
+
+from app import config
+from app.cache import ANALYTICS_SERIES_PREFIX, analytics_cache
+from app.database import db_session
+from app.logger import app_logger as logger
+from app.models import (DailyActiveUser,
+                        DailyCommandStats,
+                        DailyUserStats,
+                        ReasonCanceling,
+                        Statistics,
+                        SyncVersion,
+                        User)
+from core.repositories.sync_version_repository import SyncVersionRepository
+
+
+PARTITION_NAME = re.compile(r'^statistics_y(\d{4})m(\d{2})$')
+DEFAULT_PARTITION = 'statistics_default'
+
+
+def add_months(day: date, months: int) -> date:
+    """Returns the first day of the month `months` after the month of `day`."""
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return date(year, month + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    return f'statistics_y{month.year}m{month.month:02d}'
+
+
+class StatisticsService:
+    """
+    Maintains the daily rollups the analytics dashboard reads from. The last
+    STATISTICS_ROLLUP_DAYS days are recomputed from the source tables, older days never change.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+        self.sync_version_repository = SyncVersionRepository(session)
+
+    def refresh_rollups(self, date_from: date) -> None:
+        # Serializes refreshes started by several processes at the same time
+        sync_version = self.sync_version_repository.lock(SyncVersion.STATISTICS_ROLLUPS)
+        start = datetime.combine(date_from, time())
+        self._refresh_command_stats(date_from, start)
+        self._refresh_active_users(date_from, start)
+        self._refresh_user_stats(date_from, start)
+        sync_version.version += 1
+        self.session.commit()
+        self.invalidate_series(date_from + timedelta(days=n) for n in range((date.today() - date_from).days + 1))
+
+    def _refresh_command_stats(self, date_from: date, start: datetime) -> None:
+        day = cast(Statistics.added_date, Date)
+        self.session.execute(delete(DailyCommandStats.__table__).where(DailyCommandStats.day >= date_from))
+        self.session.execute(insert(DailyCommandStats.__table__).from_select(
+            ['day', 'command', 'count'],
+            select(day, Statistics.command, func.count())
+            .where(Statistics.added_date >= start, Statistics.command.is_not(None))
+            .group_by(day, Statistics.command)
+        ))
+
+    def _refresh_active_users(self, date_from: date, start: datetime) -> None:
+        day = cast(Statistics.added_date, Date)
+        self.session.execute(delete(DailyActiveUser.__table__).where(DailyActiveUser.day >= date_from))
+        self.session.execute(insert(DailyActiveUser.__table__).from_select(
+            ['day', 'telegram_id'],
+            select(day, Statistics.telegram_id)
+            .where(Statistics.added_date >= start, Statistics.telegram_id.is_not(None))
+            .distinct()
+        ))
+
+    def _refresh_user_stats(self, date_from: date, start: datetime) -> None:
+        counters = {
+            'added_users': self._count_by_day(User.date_registration, start),
+            'added_external_users': self._count_by_day(User.external_signup_date, start),
+            'users_unsubscribed': self._count_by_day(ReasonCanceling.added_date, start),
+        }
+        days = [date_from + timedelta(days=n) for n in range((date.today() - date_from).days + 1)]
+        self.session.execute(delete(DailyUserStats.__table__).where(DailyUserStats.day >= date_from))
+        self.session.execute(insert(DailyUserStats.__table__), [
+            {'day': day, **{name: counts.get(day, 0) for name, counts in counters.items()}}
+            for day in days
+        ])
+
+    def add_external_signup(self, signup_date: datetime, previous_signup_date: Optional[datetime]) -> None:
+        """
+        Counts an external signup on the day it falls on, in the caller's transaction.
+        The signup date comes from the site and can be long in the past, where
+        the rollups are never recomputed. After the commit the caller passes
+        both days to invalidate_series.
+        """
+        self._add_external_users(signup_date.date(), 1)
+        if previous_signup_date:
+            self._add_external_users(previous_signup_date.date(), -1)
+
+    def _add_external_users(self, day: date, value: int) -> None:
+        query = postgresql.insert(DailyUserStats.__table__).values(day=day, added_external_users=max(value, 0))
+        self.session.execute(query.on_conflict_do_update(
+            index_elements=[DailyUserStats.day],
+            set_={'added_external_users': DailyUserStats.added_external_users + value}
+        ))
+
+    def invalidate_series(self, days: Iterable[date]) -> None:
+        """Drops the cached analytics series which contain any of the days."""
+        date_limits = {day + timedelta(days=n) for day in days for n in range(config.ANALYTICS_SERIES_DAYS)}
+        analytics_cache.invalidate(*(f'{ANALYTICS_SERIES_PREFIX}{date_limit}' for date_limit in sorted(date_limits)))
+
+    def _count_by_day(self, column, start: datetime) -> dict[date, int]:
+        day = cast(column, Date)
+        query = select(day, func.count()).where(column >= start).group_by(day)
+        return dict(self.session.execute(query).all())
+
+    def maintain_partitions(self, months_ahead: int, retention_months: int) -> None:
+        """
+        Creates the monthly statistics partitions up to `months_ahead` months
+        from now and drops the partitions older than `retention_months`.
+        Rows of a month which had no partition yet are moved from the default
+        partition into the new one, expired rows are deleted from it.
+        """
+        self.sync_version_repository.lock(SyncVersion.STATISTICS_PARTITIONS)
+        current_month = date.today().replace(day=1)
+        partitions = self.get_partitions()
+        for months in range(months_ahead + 1):
+            month = add_months(current_month, months)
+            if get_partition_name(month) not in partitions:
+                self._create_partition(month)
+        oldest_month = add_months(current_month, -retention_months)
+        dropped = []
+        for partition in partitions:
+            match = PARTITION_NAME.match(partition)
+            if match and date(int(match[1]), int(match[2]), 1) < oldest_month:
+                self.session.execute(text(f'DROP TABLE {partition}'))
+                dropped.append(partition)
+        expired = self.session.execute(
+            text(f'DELETE FROM {DEFAULT_PARTITION} WHERE added_date < :oldest_month'), {'oldest_month': oldest_month}
+        ).rowcount
+        self.session.commit()
+        if dropped:
+            logger.info(f'Statistics: Dropped partitions {dropped}')
+        if expired:
+            logger.info(f'Statistics: Deleted {expired} expired rows from {DEFAULT_PARTITION}')
+
+    def _create_partition(self, month: date) -> None:
+        """
+        A partition can not be created while the default partition holds rows
+        of its month, so the table is created detached, the rows are moved
+        into it and then it is attached.
+        """
+        name = get_partition_name(month)
+        bounds = {'month_from': month, 'month_to': add_months(month, 1)}
+        self.session.execute(text(f'CREATE TABLE {name} (LIKE statistics INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        moved = self.session.execute(text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+            f'WHERE added_date >= :month_from AND added_date < :month_to RETURNING *) '
+            f'INSERT INTO {name} SELECT * FROM moved'
+        ), bounds).rowcount
+        self.session.execute(text(
+            f"ALTER TABLE statistics ATTACH PARTITION {name} FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        ))
+        if moved:
+            logger.info(f'Statistics: Moved {moved} rows from {DEFAULT_PARTITION} to {name}')
+
+    def get_partitions(self) -> list[str]:
+        query = text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            "WHERE parent.relname = 'statistics' ORDER BY child.relname"
+        )
+        return list(self.session.execute(query).scalars())
+
+
+statistics_service = StatisticsService(db_session)
+
+
+def refresh_statistics_rollups(context: CallbackContext) -> None:
+    """Job callback: recomputes the rollups of the last STATISTICS_ROLLUP_DAYS days."""
+    try:
+        statistics_service.refresh_rollups(date.today() - timedelta(days=config.STATISTICS_ROLLUP_DAYS))
+    except SQLAlchemyError as ex:
+        logger.error(f'Statistics: Rollups refresh error "{str(ex)}"')
+        db_session.rollback()
+    finally:
+        db_session.remove()
+
+
+def maintain_statistics_partitions(context: CallbackContext) -> None:
+    """Job callback: creates the next statistics partitions and drops the expired ones."""
+    try:
+        statistics_service.maintain_partitions(config.STATISTICS_PARTITIONS_AHEAD, config.STATISTICS_RETENTION_MONTHS)
+    except SQLAlchemyError as ex:
+        logger.error(f'Statistics: Partitions maintenance error "{str(ex)}"')
+        db_session.rollback()
+    finally:
+        db_session.remove()
@@ -0,0 +1,48 @@
+from typing import Optional
+
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import Query, Session
+
+from app.database import db_session
+from app.models import User, Users_Categories
+
+BIGINT_MAX = 2 ** 63 - 1
+
+
+def escape_like(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+class UserSearchService:
+    """Builds the users search query of the admin panel, without order and limit."""
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+    def get_query(self, search: str = '', has_mailing: Optional[bool] = None, banned: Optional[bool] = None,
+                  category_id: Optional[int] = None) -> Query:
+        """
+        :param search: Part of the username, email or name, or the exact telegram or external id
+        :param has_mailing: Subscription state, None for any
+        :param banned: Banned state, None for any
+        :param category_id: Only users subscribed to the category
+        """
+        query = self.session.query(User)
+        if search:
+            pattern = f'%{escape_like(search)}%'
+            conditions = [column.ilike(pattern, escape='\\')
+                          for column in (User.username, User.email, User.first_name, User.last_name)]
+            # isdecimal, unlike isdigit, accepts only characters int() can parse
+            if search.isdecimal() and int(search) <= BIGINT_MAX:
+                conditions += [User.telegram_id == int(search), User.external_id == int(search)]
+            query = query.filter(or_(*conditions))
+        for column, value in ((User.has_mailing, has_mailing), (User.banned, banned)):
+            if value is not None:
+                query = query.filter(column.is_(value))
+        if category_id is not None:
+            query = query.filter(exists().where(Users_Categories.telegram_id == User.telegram_id,
+                                                Users_Categories.category_id == category_id))
+        return query
+
+
+user_search_service = UserSearchService(db_session)
@@ -4,10 +4,13 @@ from app.models import ReasonCanceling, User, Category, Task, Users_Categories,
 from app.database import db_session
 from datetime import datetime
 from sqlalchemy.orm import load_only
-from sqlalchemy import select
+from sqlalchemy import delete, or_, select
+from sqlalchemy.dialects.postgresql import insert
 from email_validator import validate_email, EmailNotValidError
 from app.logger import bot_logger as logger
 from core.repositories.user_repository import UserRepository
+from core.services.category_tree_service import category_tree_service
+from core.services.statistics_service import statistics_service
 
 
 class UserService:
@@ -39,6 +42,11 @@ class UserService:
                 user.last_name = external_user.last_name
                 user.external_id = external_user.external_id
                 user.email = external_user.email
+                signup_days = []
+                if external_user.created_date and external_user.created_date != user.external_signup_date:
+                    statistics_service.add_external_signup(external_user.created_date, user.external_signup_date)
+                    signup_days = [signup_date.date() for signup_date in
+                                   (external_user.created_date, user.external_signup_date) if signup_date]
                 user.external_signup_date = external_user.created_date
 
                 if external_user.specializations:
@@ -53,6 +61,8 @@ class UserService:
                     db_session.commit()
                 except SQLAlchemyError as ex:
                     logger.error(f"User DB - 'add_user' method: {str(ex)}")
+                else:
+                    statistics_service.invalidate_series(signup_days)
                 return user
 
         if user.banned:
@@ -79,11 +89,10 @@ class UserService:
                 logger.error(f"User DB - 'add_user' method: {str(ex)}")
         return user
 
-    def check_user_category(self, telegram_id):
-        user_categories = User.query.get(telegram_id).categories
-        if not user_categories:
-            return False
-        return True
+    def get_user_category_ids(self, telegram_id):
+        return set(db_session.execute(
+            select(Users_Categories.category_id).where(Users_Categories.telegram_id == telegram_id)
+        ).scalars())
 
     def get_categories(self, telegram_id):
         """
@@ -91,33 +100,38 @@ class UserService:
         :param telegram_id: chat_id of current user
         :return:
         """
-        result = []
-        user_categories = [category.id for category in User.query.filter_by(telegram_id=telegram_id).first().categories]
-        all_categories = Category.query.options(load_only('id')).filter_by(archive=False)
-        for category in all_categories:
-            category_view_model = {'category_id': category.id, 'name': category.name, 'parent_id': category.parent_id}
-            if category.id in user_categories and category.parent_id:
-                category_view_model['user_selected'] = True
-            else:
-                category_view_model['user_selected'] = False
-            result.append(category_view_model)
-        return result
-
-    def get_user_active_tasks(self, telegram_id, shown_task):
-        users_categories_telegram_ids = db_session.query(Users_Categories.telegram_id).all()
-        telegram_ids = [telegram_id[0] for telegram_id in users_categories_telegram_ids]
-        if telegram_id in telegram_ids:
-            db_query = select(Task, Category.name). \
-                where(Users_Categories.telegram_id == telegram_id). \
-                where(Task.archive == False).where(~Task.id.in_(shown_task)). \
-                join(Users_Categories, Users_Categories.category_id == Task.category_id). \
-                join(Category, Category.id == Users_Categories.category_id)
-        else:
-            db_query = select(Task, Category.name). \
-                where(Task.archive == False).where(~Task.id.in_(shown_task)). \
-                join(Category, Category.id == Task.category_id)
-        result = db_session.execute(db_query)
-        return [[task, category_name] for task, category_name in result]
+        user_categories = self.get_user_category_ids(telegram_id)
+        return [
+            {'category_id': category.id,
+             'name': category.name,
+             'parent_id': category.parent_id,
+             'user_selected': bool(category.id in user_categories and category.parent_id)}
+            for category in category_tree_service.get_tree().active_categories()
+        ]
+
+    def get_user_active_tasks(self, telegram_id, last_shown_task_id, limit):
+        """
+        Returns up to `limit` active tasks after last_shown_task_id in the categories
+        of the user (or all of them if the user has no categories) ordered by id,
+        and whether there are more tasks after them.
+        """
+        user_categories = select(Users_Categories.category_id).where(Users_Categories.telegram_id == telegram_id)
+        db_query = select(
+            Task.id,
+            Task.title,
+            Task.name_organization,
+            Task.location,
+            Task.bonus,
+            Task.deadline,
+            Task.link,
+            Task.content_hash,
+            Category.name.label('category_name')
+        ).join(Category, Category.id == Task.category_id). \
+            where(Task.archive == False).where(Task.id > last_shown_task_id). \
+            where(or_(~user_categories.exists(), Task.category_id.in_(user_categories))). \
+            order_by(Task.id).limit(limit + 1)
+        tasks = db_session.execute(db_query).all()
+        return tasks[:limit], len(tasks) > limit
 
     def change_subscription(self, telegram_id):
         """
@@ -139,15 +153,21 @@ class UserService:
         return user.has_mailing
 
     def change_user_category(self, telegram_id, category_id):
-        user = User.query.filter_by(telegram_id=telegram_id).first()
-        category = Category.query.get(category_id)
-
-        if category in user.categories:
-            user.categories.remove(category)
-            db_session.add(user)
-        else:
-            user.categories.append(category)
-            db_session.add(user)
+        """
+        Toggles the category of the user with a single DELETE, the INSERT runs only if nothing was deleted.
+        """
+        users_categories = Users_Categories.__table__
+        deleted = db_session.execute(
+            delete(users_categories)
+            .where(users_categories.c.telegram_id == telegram_id, users_categories.c.category_id == category_id)
+            .returning(users_categories.c.category_id)
+        ).first()
+        if not deleted:
+            db_session.execute(
+                insert(users_categories)
+                .values(telegram_id=telegram_id, category_id=category_id)
+                .on_conflict_do_nothing()
+            )
         try:
             db_session.commit()
         except SQLAlchemyError as ex:
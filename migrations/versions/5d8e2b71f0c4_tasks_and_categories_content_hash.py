@@ -0,0 +1,98 @@
+"""Tasks and categories content hash
+
+Revision ID: 5d8e2b71f0c4
+Revises: c3f1a9d24b7e
+Create Date: 2026-10-17 11:03:52.117640
+
+"""
+import hashlib
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d8e2b71f0c4'
+down_revision = 'c3f1a9d24b7e'
+branch_labels = None
+depends_on = None
+
+tasks = sa.table('tasks',
+                 sa.column('id', sa.Integer),
+                 sa.column('title', sa.String),
+                 sa.column('name_organization', sa.String),
+                 sa.column('deadline', sa.Date),
+                 sa.column('category_id', sa.Integer),
+                 sa.column('bonus', sa.Integer),
+                 sa.column('location', sa.String),
+                 sa.column('link', sa.String),
+                 sa.column('description', sa.String),
+                 sa.column('content_hash', sa.String))
+categories = sa.table('categories',
+                      sa.column('id', sa.Integer),
+                      sa.column('name', sa.String),
+                      sa.column('parent_id', sa.Integer),
+                      sa.column('content_hash', sa.String))
+
+
+def upgrade():
+    op.add_column('tasks', sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_tasks_content_hash'), 'tasks', ['content_hash'], unique=False)
+    op.add_column('categories', sa.Column('content_hash', sa.String(length=32), nullable=True))
+    op.create_index(op.f('ix_categories_content_hash'), 'categories', ['content_hash'], unique=False)
+    fill_content_hashes()
+
+
+def content_hash(data):
+    """RequestBase.content_hash as of this revision, copied so the migration doesn't depend on the models."""
+    data = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(data.encode(), digest_size=16).hexdigest()
+
+
+def fill_content_hashes():
+    """
+    Hashes the stored tasks and categories the same way the webhooks hash the
+    requests, so the first sync after the migration sees them as unchanged.
+    Rows with a NULL in a field the request models require keep a NULL hash
+    and are refreshed by the next sync without notifications.
+    """
+    connection = op.get_bind()
+    task_hashes = []
+    for task in connection.execute(sa.select(tasks)):
+        if None in (task.title, task.name_organization, task.deadline, task.category_id, task.bonus, task.link):
+            continue
+        task_hashes.append({'task_id': task.id, 'hash': content_hash({
+            'id': task.id,
+            'title': task.title,
+            'name_organization': task.name_organization,
+            'deadline': task.deadline.isoformat(),
+            'category_id': task.category_id,
+            'bonus': task.bonus,
+            'location': task.location,
+            'link': task.link,
+            'description': task.description,
+        })})
+    if task_hashes:
+        connection.execute(tasks.update().where(tasks.c.id == sa.bindparam('task_id'))
+                           .values(content_hash=sa.bindparam('hash')), task_hashes)
+
+    category_hashes = []
+    for category in connection.execute(sa.select(categories)):
+        if category.name is None:
+            continue
+        category_hashes.append({'category_id': category.id, 'hash': content_hash({
+            'id': category.id,
+            'name': category.name,
+            'parent_id': category.parent_id,
+        })})
+    if category_hashes:
+        connection.execute(categories.update().where(categories.c.id == sa.bindparam('category_id'))
+                           .values(content_hash=sa.bindparam('hash')), category_hashes)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_categories_content_hash'), table_name='categories')
+    op.drop_column('categories', 'content_hash')
+    op.drop_index(op.f('ix_tasks_content_hash'), table_name='tasks')
+    op.drop_column('tasks', 'content_hash')
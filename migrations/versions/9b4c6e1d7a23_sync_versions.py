@@ -0,0 +1,29 @@
+"""Sync versions
+
+Revision ID: 9b4c6e1d7a23
+Revises: 5d8e2b71f0c4
+Create Date: 2026-10-17 11:41:08.530911
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4c6e1d7a23'
+down_revision = '5d8e2b71f0c4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sync_versions',
+                    sa.Column('name', sa.String(length=32), nullable=False),
+                    sa.Column('version', sa.BigInteger(), server_default='0', nullable=False),
+                    sa.Column('updated_date', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+                    sa.PrimaryKeyConstraint('name')
+                    )
+
+
+def downgrade():
+    op.drop_table('sync_versions')
@@ -0,0 +1,25 @@
+"""Statistics added_date, telegram_id index
+
+Revision ID: a6d3f9e2c4b8
+Revises: f2c8d0a4b6e1
+Create Date: 2026-10-17 15:48:12.604357
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6d3f9e2c4b8'
+down_revision = 'f2c8d0a4b6e1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_statistics_added_date_telegram_id', 'statistics', ['added_date', 'telegram_id'], unique=False)
+    op.drop_index('ix_statistics_added_date', table_name='statistics')
+
+
+def downgrade():
+    op.create_index('ix_statistics_added_date', 'statistics', ['added_date'], unique=False)
+    op.drop_index('ix_statistics_added_date_telegram_id', table_name='statistics')
@@ -0,0 +1,80 @@
+"""Partition statistics by month
+
+Revision ID: b8e1c5d7f3a9
+Revises: a6d3f9e2c4b8
+Create Date: 2026-10-17 16:27:35.941822
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e1c5d7f3a9'
+down_revision = 'a6d3f9e2c4b8'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 2
+
+
+def add_months(day, months):
+    year, month = divmod(day.year * 12 + day.month - 1 + months, 12)
+    return date(year, month + 1, 1)
+
+
+def upgrade():
+    op.execute('ALTER TABLE statistics RENAME TO statistics_old')
+    op.execute('ALTER TABLE statistics_old RENAME CONSTRAINT statistics_pkey TO statistics_old_pkey')
+    op.execute('ALTER INDEX ix_statistics_added_date_telegram_id RENAME TO ix_statistics_old_added_date_telegram_id')
+    op.execute('ALTER SEQUENCE statistics_id_seq OWNED BY NONE')
+    op.execute("""
+        CREATE TABLE statistics (
+            id INTEGER NOT NULL DEFAULT nextval('statistics_id_seq'),
+            telegram_id BIGINT,
+            command VARCHAR(100),
+            added_date TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT now(),
+            PRIMARY KEY (id, added_date)
+        ) PARTITION BY RANGE (added_date)
+    """)
+    op.execute('ALTER SEQUENCE statistics_id_seq OWNED BY statistics.id')
+    op.create_index('ix_statistics_added_date_telegram_id', 'statistics', ['added_date', 'telegram_id'], unique=False)
+    # Rows outside of every monthly partition are kept instead of failing the insert
+    op.execute('CREATE TABLE statistics_default PARTITION OF statistics DEFAULT')
+
+    first_date = op.get_bind().execute(sa.text('SELECT min(added_date) FROM statistics_old')).scalar()
+    current_month = date.today().replace(day=1)
+    month = first_date.date().replace(day=1) if first_date else current_month
+    while month <= add_months(current_month, MONTHS_AHEAD):
+        op.execute(
+            f'CREATE TABLE statistics_y{month.year}m{month.month:02d} PARTITION OF statistics '
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        )
+        month = add_months(month, 1)
+
+    op.execute('INSERT INTO statistics (id, telegram_id, command, added_date) '
+               'SELECT id, telegram_id, command, added_date FROM statistics_old')
+    op.drop_table('statistics_old')
+
+
+def downgrade():
+    op.execute('ALTER TABLE statistics RENAME TO statistics_partitioned')
+    op.execute('ALTER TABLE statistics_partitioned RENAME CONSTRAINT statistics_pkey TO statistics_partitioned_pkey')
+    op.execute('ALTER INDEX ix_statistics_added_date_telegram_id '
+               'RENAME TO ix_statistics_partitioned_added_date_telegram_id')
+    op.execute('ALTER SEQUENCE statistics_id_seq OWNED BY NONE')
+    op.create_table('statistics',
+                    sa.Column('id', sa.Integer(), server_default=sa.text("nextval('statistics_id_seq')"),
+                              nullable=False),
+                    sa.Column('telegram_id', sa.BigInteger(), nullable=True),
+                    sa.Column('command', sa.String(length=100), nullable=True),
+                    sa.Column('added_date', sa.TIMESTAMP(), nullable=False),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.execute('ALTER SEQUENCE statistics_id_seq OWNED BY statistics.id')
+    op.create_index('ix_statistics_added_date_telegram_id', 'statistics', ['added_date', 'telegram_id'], unique=False)
+    op.execute('INSERT INTO statistics (id, telegram_id, command, added_date) '
+               'SELECT id, telegram_id, command, added_date FROM statistics_partitioned')
+    op.drop_table('statistics_partitioned')
@@ -0,0 +1,45 @@
+"""Notifications outbox and delivery counters
+
+Revision ID: c3f1a9d24b7e
+Revises: 0e74b21e97f4
+Create Date: 2026-10-17 10:12:31.408215
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d24b7e'
+down_revision = '0e74b21e97f4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('notifications', sa.Column('queued_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('notifications', sa.Column('sent_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('notifications', sa.Column('failed_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('notifications_outbox',
+                    sa.Column('id', sa.BigInteger(), nullable=False),
+                    sa.Column('notification_id', sa.Integer(), nullable=False),
+                    sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+                    sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+                    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('last_error', sa.String(length=256), nullable=True),
+                    sa.Column('claimed_date', sa.TIMESTAMP(), nullable=True),
+                    sa.Column('updated_date', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+                    sa.ForeignKeyConstraint(['notification_id'], ['notifications.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('notification_id', 'telegram_id')
+                    )
+    op.create_index('ix_notifications_outbox_pending', 'notifications_outbox', ['id'], unique=False,
+                    postgresql_where=sa.text("status IN ('queued', 'sending')"))
+
+
+def downgrade():
+    op.drop_index('ix_notifications_outbox_pending', table_name='notifications_outbox')
+    op.drop_table('notifications_outbox')
+    op.drop_column('notifications', 'failed_count')
+    op.drop_column('notifications', 'sent_count')
+    op.drop_column('notifications', 'queued_count')
@@ -0,0 +1,25 @@
+"""Users date_registration, telegram_id index
+
+Revision ID: c4a7e2f9b1d6
+Revises: b8e1c5d7f3a9
+Create Date: 2026-10-17 17:05:19.283740
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2f9b1d6'
+down_revision = 'b8e1c5d7f3a9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_users_date_registration_telegram_id', 'users',
+                    [sa.text('date_registration DESC'), sa.text('telegram_id DESC')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_users_date_registration_telegram_id', table_name='users')
@@ -0,0 +1,29 @@
+"""Users search trigram indexes
+
+Revision ID: d9f4b2a6e8c3
+Revises: c4a7e2f9b1d6
+Create Date: 2026-10-17 17:43:51.470216
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9f4b2a6e8c3'
+down_revision = 'c4a7e2f9b1d6'
+branch_labels = None
+depends_on = None
+
+COLUMNS = ('username', 'email', 'first_name', 'last_name')
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in COLUMNS:
+        op.create_index(f'ix_users_{column}_trgm', 'users', [column], unique=False,
+                        postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    for column in COLUMNS:
+        op.drop_index(f'ix_users_{column}_trgm', table_name='users')
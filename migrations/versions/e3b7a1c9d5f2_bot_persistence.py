@@ -0,0 +1,31 @@
+"""Bot persistence
+
+Revision ID: e3b7a1c9d5f2
+Revises: d9f4b2a6e8c3
+Create Date: 2026-10-17 18:21:07.856394
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7a1c9d5f2'
+down_revision = 'd9f4b2a6e8c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('bot_persistence',
+                    sa.Column('kind', sa.String(length=64), nullable=False),
+                    sa.Column('key', sa.String(length=64), nullable=False),
+                    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+                    sa.Column('updated_date', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+                    sa.PrimaryKeyConstraint('kind', 'key')
+                    )
+
+
+def downgrade():
+    op.drop_table('bot_persistence')
@@ -0,0 +1,40 @@
+"""Webhook jobs
+
+Revision ID: e7a05c3b9f18
+Revises: 9b4c6e1d7a23
+Create Date: 2026-10-17 12:26:44.902374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a05c3b9f18'
+down_revision = '9b4c6e1d7a23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('webhook_jobs',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('kind', sa.String(length=16), nullable=False),
+                    sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+                    sa.Column('payload_path', sa.String(length=256), nullable=False),
+                    sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+                    sa.Column('error', sa.String(length=1024), nullable=True),
+                    sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('created_date', sa.TIMESTAMP(), server_default=sa.text('now()'), nullable=False),
+                    sa.Column('started_date', sa.TIMESTAMP(), nullable=True),
+                    sa.Column('finished_date', sa.TIMESTAMP(), nullable=True),
+                    sa.PrimaryKeyConstraint('id')
+                    )
+    op.create_index('ix_webhook_jobs_pending', 'webhook_jobs', ['id'], unique=False,
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+
+
+def downgrade():
+    op.drop_index('ix_webhook_jobs_pending', table_name='webhook_jobs')
+    op.drop_table('webhook_jobs')
@@ -0,0 +1,73 @@
+"""Daily statistics rollups
+
+Revision ID: f2c8d0a4b6e1
+Revises: e7a05c3b9f18
+Create Date: 2026-10-17 15:02:44.118206
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c8d0a4b6e1'
+down_revision = 'e7a05c3b9f18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_statistics_added_date', 'statistics', ['added_date'], unique=False)
+    op.create_table('daily_command_stats',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('command', sa.String(length=100), nullable=False),
+                    sa.Column('count', sa.Integer(), nullable=False),
+                    sa.PrimaryKeyConstraint('day', 'command')
+                    )
+    op.create_table('daily_active_users',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+                    sa.PrimaryKeyConstraint('day', 'telegram_id')
+                    )
+    op.create_table('daily_user_stats',
+                    sa.Column('day', sa.Date(), nullable=False),
+                    sa.Column('added_users', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('added_external_users', sa.Integer(), server_default='0', nullable=False),
+                    sa.Column('users_unsubscribed', sa.Integer(), server_default='0', nullable=False),
+                    sa.PrimaryKeyConstraint('day')
+                    )
+
+    op.execute("""
+        INSERT INTO daily_command_stats (day, command, count)
+        SELECT added_date::date, command, count(*)
+        FROM statistics
+        WHERE command IS NOT NULL
+        GROUP BY added_date::date, command
+    """)
+    op.execute("""
+        INSERT INTO daily_active_users (day, telegram_id)
+        SELECT DISTINCT added_date::date, telegram_id
+        FROM statistics
+        WHERE telegram_id IS NOT NULL
+    """)
+    op.execute("""
+        INSERT INTO daily_user_stats (day, added_users, added_external_users, users_unsubscribed)
+        SELECT day, sum(added_users), sum(added_external_users), sum(users_unsubscribed)
+        FROM (
+            SELECT date_registration::date AS day, 1 AS added_users,
+                   0 AS added_external_users, 0 AS users_unsubscribed
+            FROM users
+            UNION ALL
+            SELECT external_signup_date::date, 0, 1, 0 FROM users WHERE external_signup_date IS NOT NULL
+            UNION ALL
+            SELECT added_date::date, 0, 0, 1 FROM reasons_canceling
+        ) AS events
+        GROUP BY day
+    """)
+
+
+def downgrade():
+    op.drop_table('daily_user_stats')
+    op.drop_table('daily_active_users')
+    op.drop_table('daily_command_stats')
+    op.drop_index('ix_statistics_added_date', table_name='statistics')
@@ -0,0 +1,25 @@
+"""Active tasks category_id, id index
+
+Revision ID: f6c2d8e4a0b7
+Revises: e3b7a1c9d5f2
+Create Date: 2026-10-17 18:58:42.317589
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c2d8e4a0b7'
+down_revision = 'e3b7a1c9d5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_tasks_active_category_id_id', 'tasks', ['category_id', 'id'], unique=False,
+                    postgresql_where=sa.text('archive = false'))
+
+
+def downgrade():
+    op.drop_index('ix_tasks_active_category_id_id', table_name='tasks')
@@ -0,0 +1,154 @@
+"""
+Compares the users and active users analytics of the old dashboard with the
+current one on a fixture of synthetic users and 1M statistics rows over the
+last 30 days. The old version loaded the users into Python and bound their
+ids into IN lists; the current one counts with FILTER aggregates over the
+daily_active_users rollup, whose refresh is measured too.
+
+Usage: python scripts/bench_analytics.py [users] [statistics rows]
+
+The queries of both versions are copied here, because importing app.front
+starts the bot. Needs a scratch database from .env with the migrations
+applied: the rollups are rebuilt for the last 30 days before and after the
+benchmark. The rows of the fixture are removed at the end.
+"""
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete, distinct, text  # noqa: E402
+from sqlalchemy.sql import func  # noqa: E402
+
+from app import config  # noqa: E402
+from app.database import db_session, engine  # noqa: E402
+from app.models import DailyActiveUser, Statistics, User  # noqa: E402
+from core.services.statistics_service import StatisticsService  # noqa: E402
+
+# Ids far above real telegram ids, so the benchmark rows are easy to remove
+FIRST_USER_ID = 10 ** 15
+DAYS_NUMBER = 30
+
+
+def create_fixture(users, rows):
+    with engine.begin() as connection:
+        connection.execute(text(
+            'INSERT INTO users (telegram_id, has_mailing, banned, date_registration) '
+            'SELECT :first + n, n % 2 = 0, n % 50 = 0, now() - (n % 365) * interval \'1 day\' '
+            'FROM generate_series(0, :users - 1) AS n'
+        ), {'first': FIRST_USER_ID, 'users': users})
+        connection.execute(text(
+            'INSERT INTO statistics (telegram_id, command, added_date) '
+            'SELECT :first + (random() * (:users - 1))::int, \'benchmark\', '
+            'now() - random() * interval \'30 days\' '
+            'FROM generate_series(1, :rows)'
+        ), {'first': FIRST_USER_ID, 'users': users, 'rows': rows})
+        connection.execute(text('ANALYZE users'))
+        connection.execute(text('ANALYZE statistics'))
+
+
+def remove_fixture():
+    with engine.begin() as connection:
+        connection.execute(delete(Statistics.__table__).where(Statistics.telegram_id >= FIRST_USER_ID))
+        connection.execute(delete(User.__table__).where(User.telegram_id >= FIRST_USER_ID))
+
+
+def old_number_users():
+    users = db_session.query(User.has_mailing, User.banned).all()
+    return {
+        'all_users': len(users),
+        'subscribed_users': len([user for user in users if user[0] and not user[1]]),
+        'not_subscribed_users': len([user for user in users if not user[0] and not user[1]]),
+        'banned_users': len([user for user in users if user[1]]),
+    }
+
+
+def new_number_users():
+    return dict(db_session.query(
+        func.count(User.telegram_id).label('all_users'),
+        func.count(User.telegram_id).filter(User.has_mailing.is_(True), User.banned.is_(False))
+        .label('subscribed_users'),
+        func.count(User.telegram_id).filter(User.has_mailing.is_not(True), User.banned.is_(False))
+        .label('not_subscribed_users'),
+        func.count(User.telegram_id).filter(User.banned.is_(True)).label('banned_users'),
+    ).one()._mapping)
+
+
+def old_active_by_days(date_begin, telegram_ids=None):
+    day = func.to_char(Statistics.added_date, 'YYYY-MM-DD')
+    query = db_session.query(day, func.count(distinct(Statistics.telegram_id)))\
+        .filter(Statistics.added_date > date_begin)
+    if telegram_ids is not None:
+        query = query.filter(Statistics.telegram_id.in_(telegram_ids))
+    return dict(query.group_by(day).all())
+
+
+def old_activity(date_begin, date_limit):
+    users = db_session.query(User.telegram_id, User.has_mailing).all()
+    return {
+        'all': old_active_by_days(date_begin),
+        'subscribed': old_active_by_days(date_begin, [user[0] for user in users if user[1] is True]),
+        'unsubscribed': old_active_by_days(date_begin, [user[0] for user in users if user[1] is False]),
+        'active_users_per_month': db_session.query(func.count(distinct(Statistics.telegram_id)))
+        .filter(Statistics.added_date > date_begin).scalar(),
+    }
+
+
+def new_activity(date_begin, date_limit):
+    days = db_session.query(
+        DailyActiveUser.day,
+        func.count(DailyActiveUser.telegram_id).label('all'),
+        func.count(DailyActiveUser.telegram_id).filter(User.has_mailing.is_(True)).label('subscribed'),
+        func.count(DailyActiveUser.telegram_id).filter(User.has_mailing.is_(False)).label('unsubscribed'),
+    ).outerjoin(User, User.telegram_id == DailyActiveUser.telegram_id)\
+        .filter(DailyActiveUser.day > date_begin, DailyActiveUser.day <= date_limit)\
+        .group_by(DailyActiveUser.day).all()
+    return {
+        'days': days,
+        'active_users_per_month': db_session.query(func.count(distinct(DailyActiveUser.telegram_id)))
+        .filter(DailyActiveUser.day > date_begin, DailyActiveUser.day <= date_limit).scalar(),
+    }
+
+
+def refresh_rollups(date_from):
+    StatisticsService(db_session).refresh_rollups(date_from)
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    try:
+        function(*args)
+    finally:
+        db_session.remove()
+    return time.perf_counter() - start
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    date_limit = date.today()
+    date_begin = date_limit - timedelta(days=DAYS_NUMBER)
+    create_fixture(users, rows)
+    try:
+        results = [
+            ('rollups, 30 days rebuild', None, measure(refresh_rollups, date_begin)),
+            (f'rollups, last {config.STATISTICS_ROLLUP_DAYS} day refresh', None,
+             measure(refresh_rollups, date_limit - timedelta(days=config.STATISTICS_ROLLUP_DAYS))),
+            ('number of users', measure(old_number_users), measure(new_number_users)),
+            ('active users by day', measure(old_activity, date_begin, date_limit),
+             measure(new_activity, date_begin, date_limit)),
+        ]
+    finally:
+        remove_fixture()
+        measure(refresh_rollups, date_begin)
+    print(f'{users} users, {rows} statistics rows')
+    print(f'{"query":>26} {"old, s":>8} {"new, s":>8}')
+    for name, old, new in results:
+        print(f'{name:>26} {"-" if old is None else f"{old:.3f}":>8} {new:>8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Measures the overhead log_command adds to every handler of bot/handlers:
+the old decorator, which inspected the caller frame to skip logging, against
+the current one with the suppression context variable. The statistics sink
+is replaced by a no-op in both, so only the decorator itself is measured.
+
+Usage: python scripts/bench_log_command.py [calls]
+
+Needs the settings from .env, the handlers modules are imported.
+"""
+import inspect
+import os
+import sys
+import timeit
+from types import SimpleNamespace
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bot.decorators import logger as logger_module  # noqa: E402
+from bot.decorators.logger import log_command, suppress_command_logging  # noqa: E402
+from bot.handlers import categories_handler, feedback_handler, subscription_handler  # noqa: E402
+
+# The old decorator of choose_category skipped the calls from this function
+OLD_IGNORE_FUNC = {'choose_category': ['change_user_categories']}
+UPDATE = SimpleNamespace(effective_user=SimpleNamespace(id=1))
+
+
+class NullSink:
+    def add(self, telegram_id, command):
+        pass
+
+
+sink = NullSink()
+
+
+def old_log_command(command, ignore_func: list = None):
+    """log_command before the context variable, with the Statistics commit replaced by the sink."""
+    def log(func):
+        def wrapper(*args, **kwargs):
+            try:
+                update = args[0]
+                if ignore_func:
+                    current_frame = inspect.currentframe()
+                    caller_frame = current_frame.f_back
+                    code_obj = caller_frame.f_code
+                    code_obj_name = code_obj.co_name
+
+                    if code_obj_name in ignore_func:
+                        return func(*args, **kwargs)
+
+                sink.add(update.effective_user.id, command)
+                return func(*args, **kwargs)
+            except Exception:
+                pass
+
+        return wrapper
+
+    return log
+
+
+def handler(update, context):
+    return None
+
+
+def decorated_handlers():
+    for module in (categories_handler, feedback_handler, subscription_handler):
+        for name, function in vars(module).items():
+            # log_command can be under other decorators, like send_typing_action
+            while inspect.isfunction(function) and hasattr(function, '__wrapped__'):
+                command = inspect.getclosurevars(function).nonlocals.get('command')
+                if command is not None:
+                    yield name, command
+                    break
+                function = function.__wrapped__
+
+
+def measure(function, calls):
+    return min(timeit.repeat(function, number=calls, repeat=5)) / calls * 10 ** 9
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    logger_module.statistics_writer = sink
+    print(f'{"handler":>24} {"old, ns":>8} {"new, ns":>8}')
+    plain = measure(lambda: handler(UPDATE, None), calls)
+    old_total = new_total = 0
+    handlers = list(decorated_handlers())
+    for name, command in handlers:
+        old = old_log_command(command, OLD_IGNORE_FUNC.get(name))(handler)
+        new = log_command(command)(handler)
+        old_time = measure(lambda: old(UPDATE, None), calls) - plain
+        new_time = measure(lambda: new(UPDATE, None), calls) - plain
+        old_total += old_time
+        new_total += new_time
+        print(f'{name:>24} {old_time:>8.0f} {new_time:>8.0f}')
+    print(f'{"average of " + str(len(handlers)):>24} {old_total / len(handlers):>8.0f} '
+          f'{new_total / len(handlers):>8.0f}')
+
+    old = old_log_command('choose_category', OLD_IGNORE_FUNC['choose_category'])(handler)
+    new = log_command('choose_category')(handler)
+
+    def change_user_categories():
+        old(UPDATE, None)
+
+    def suppressed():
+        with suppress_command_logging():
+            new(UPDATE, None)
+
+    print(f'{"suppressed call":>24} {measure(change_user_categories, calls) - plain:>8.0f} '
+          f'{measure(suppressed, calls) - plain:>8.0f}')
+
+
+if __name__ == '__main__':
+    main()
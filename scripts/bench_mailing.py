@@ -0,0 +1,128 @@
+"""
+Compares the broadcast time of MailingEngine with the sequential mailing it
+replaced (5 messages, then a 1 second pause), against a local stub of the
+Bot API. The stub answers after a fixed latency and, like Telegram, answers
+429 with retry_after when more than FLOOD_LIMIT messages a second are sent.
+
+Usage: python scripts/bench_mailing.py [messages ...]
+
+Needs the settings from .env, the database is not used while the messages
+are delivered. The engine is also timed with PER_CHAT adjacent messages to
+each chat, which it has to spread out by MAILING_CHAT_INTERVAL.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from telegram import Bot  # noqa: E402
+from telegram.utils.request import Request  # noqa: E402
+
+from app import config  # noqa: E402
+from bot.mailing import MailingEngine, SendUserMessageContext  # noqa: E402
+
+TOKEN = '123456:benchmark'
+LATENCY = 0.05  # seconds, a usual round trip to api.telegram.org
+FLOOD_LIMIT = 30  # messages per second
+OLD_BATCH_SIZE = 5
+FIRST_CHAT_ID = 10 ** 15
+# Messages in a row to one chat, like several new tasks for one volunteer
+PER_CHAT = 4
+
+
+class StubBotApi(BaseHTTPRequestHandler):
+    sent = deque()
+    flood_errors = 0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(LATENCY)
+        with self.lock:
+            now = time.monotonic()
+            while self.sent and self.sent[0] < now - 1:
+                self.sent.popleft()
+            flood = len(self.sent) >= FLOOD_LIMIT
+            if flood:
+                StubBotApi.flood_errors += 1
+            else:
+                self.sent.append(now)
+        if flood:
+            self.answer(429, {'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                              'parameters': {'retry_after': 1}})
+            return
+        params = json.loads(body or b'{}')
+        self.answer(200, {'ok': True, 'result': {
+            'message_id': 1,
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            'text': params.get('text', ''),
+        }})
+
+    def answer(self, status, data):
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def messages(size, per_chat=1):
+    """Messages to `size // per_chat` chats, the messages of one chat are adjacent."""
+    return [SendUserMessageContext(message=f'Benchmark message {index}',
+                                   telegram_id=FIRST_CHAT_ID + index // per_chat)
+            for index in range(size)]
+
+
+def bench_old(bot, contexts):
+    """The loop of the old send_batch_messages job."""
+    start = time.perf_counter()
+    for index in range(0, len(contexts), OLD_BATCH_SIZE):
+        for context in contexts[index:index + OLD_BATCH_SIZE]:
+            bot.send_message(chat_id=context.telegram_id, text=context.message)
+        time.sleep(1)
+    return time.perf_counter() - start, 0
+
+
+def bench_engine(bot, contexts):
+    engine = MailingEngine(bot)
+    start = time.perf_counter()
+    futures = engine.broadcast(contexts)
+    failed = sum(1 for future in futures if future.result() is not None)
+    elapsed = time.perf_counter() - start
+    engine.executor.shutdown()
+    return elapsed, failed
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [100, 1000]
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubBotApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    bot = Bot(TOKEN, base_url=f'http://127.0.0.1:{server.server_port}/bot',
+              request=Request(con_pool_size=config.MAILING_WORKERS + 4))
+    print(f'Stub latency {LATENCY * 1000:.0f} ms, flood limit {FLOOD_LIMIT}/s, '
+          f'engine {config.MAILING_WORKERS} workers at {config.MAILING_RATE_LIMIT}/s')
+    print(f'{"messages":>8} {"mailing":>16} {"time, s":>8} {"msg/s":>6} {"429":>5} {"failed":>6}')
+    for size in sizes:
+        for name, bench, per_chat in (('sequential', bench_old, 1), ('engine', bench_engine, 1),
+                                      (f'engine, {PER_CHAT}/chat', bench_engine, PER_CHAT)):
+            time.sleep(1)
+            StubBotApi.flood_errors = 0
+            elapsed, failed = bench(bot, messages(size, per_chat))
+            print(f'{size:>8} {name:>16} {elapsed:>8.1f} {size / elapsed:>6.1f} '
+                  f'{StubBotApi.flood_errors:>5} {failed:>6}')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
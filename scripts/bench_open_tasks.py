@@ -0,0 +1,152 @@
+"""
+Times one "show open tasks" tap while users_categories grows: the old
+get_user_active_tasks, which read the whole users_categories table and
+returned every matching Task, against the current keyset query of one page.
+Both are timed for a user with three categories and for a user without
+categories, who sees the tasks of all categories.
+
+Usage: python scripts/bench_open_tasks.py [users_categories rows ...]
+
+Needs the database from .env with the migrations applied, preferably a
+scratch one. The rows of the fixture are removed at the end.
+"""
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete, select, text  # noqa: E402
+
+from app.database import db_session, engine  # noqa: E402
+from app.models import Category, Task, User, Users_Categories  # noqa: E402
+from core.repositories.user_repository import UserRepository  # noqa: E402
+from core.services.user_service import UserService  # noqa: E402
+
+# Ids far above real ids, so the benchmark rows are easy to remove
+FIRST_USER_ID = 10 ** 15
+FIRST_TASK_ID = 10 ** 9
+FIRST_CATEGORY_ID = 10 ** 9
+CATEGORIES = 50
+TASKS = 5000
+USER_CATEGORIES = 5
+PAGINATION = 3
+RUNS = 5
+SUBSCRIBED_USER_ID = FIRST_USER_ID
+UNSUBSCRIBED_USER_ID = FIRST_USER_ID + 1
+
+user_service = UserService(UserRepository(db_session))
+
+
+def create_fixture():
+    with engine.begin() as connection:
+        connection.execute(text(
+            'INSERT INTO categories (id, name, archive) '
+            'SELECT :first + n, \'Benchmark \' || n, false FROM generate_series(0, :categories - 1) AS n'
+        ), {'first': FIRST_CATEGORY_ID, 'categories': CATEGORIES})
+        connection.execute(text(
+            'INSERT INTO tasks (id, title, name_organization, deadline, category_id, bonus, link, archive) '
+            'SELECT :first + n, \'Benchmark task \' || n, \'Benchmark\', current_date + 30, '
+            ':first_category + n % :categories, 5, \'https://procharity.ru/tasks/\' || n, false '
+            'FROM generate_series(0, :tasks - 1) AS n'
+        ), {'first': FIRST_TASK_ID, 'first_category': FIRST_CATEGORY_ID, 'categories': CATEGORIES, 'tasks': TASKS})
+        connection.execute(text(
+            'INSERT INTO users (telegram_id, has_mailing, date_registration) '
+            'VALUES (:subscribed, true, now()), (:unsubscribed, true, now())'
+        ), {'subscribed': SUBSCRIBED_USER_ID, 'unsubscribed': UNSUBSCRIBED_USER_ID})
+        connection.execute(text(
+            'INSERT INTO users_categories (telegram_id, category_id) '
+            'SELECT :user, :first_category + n FROM generate_series(0, 2) AS n'
+        ), {'user': SUBSCRIBED_USER_ID, 'first_category': FIRST_CATEGORY_ID})
+
+
+def grow_users_categories(users, rows):
+    """Adds users with USER_CATEGORIES categories each until users_categories has `rows` fixture rows."""
+    new_users = rows // USER_CATEGORIES - users
+    if new_users <= 0:
+        return users
+    with engine.begin() as connection:
+        connection.execute(text(
+            'INSERT INTO users (telegram_id, has_mailing, date_registration) '
+            'SELECT :first + n, true, now() FROM generate_series(:users, :users + :new_users - 1) AS n'
+        ), {'first': FIRST_USER_ID + 2, 'users': users, 'new_users': new_users})
+        connection.execute(text(
+            'INSERT INTO users_categories (telegram_id, category_id) '
+            'SELECT :first + n, :first_category + (n + c) % :categories '
+            'FROM generate_series(:users, :users + :new_users - 1) AS n, generate_series(0, :per_user - 1) AS c'
+        ), {'first': FIRST_USER_ID + 2, 'users': users, 'new_users': new_users, 'per_user': USER_CATEGORIES,
+            'first_category': FIRST_CATEGORY_ID, 'categories': CATEGORIES})
+        connection.execute(text('ANALYZE users_categories'))
+    return users + new_users
+
+
+def remove_fixture():
+    with engine.begin() as connection:
+        connection.execute(delete(Users_Categories.__table__).where(Users_Categories.telegram_id >= FIRST_USER_ID))
+        connection.execute(delete(User.__table__).where(User.telegram_id >= FIRST_USER_ID))
+        connection.execute(delete(Task.__table__).where(Task.id >= FIRST_TASK_ID))
+        connection.execute(delete(Category.__table__).where(Category.id >= FIRST_CATEGORY_ID))
+
+
+def old_get_user_active_tasks(telegram_id, shown_task):
+    """get_user_active_tasks before the change."""
+    users_categories_telegram_ids = db_session.query(Users_Categories.telegram_id).all()
+    telegram_ids = [telegram_id[0] for telegram_id in users_categories_telegram_ids]
+    if telegram_id in telegram_ids:
+        db_query = select(Task, Category.name). \
+            where(Users_Categories.telegram_id == telegram_id). \
+            where(Task.archive == False).where(~Task.id.in_(shown_task)). \
+            join(Users_Categories, Users_Categories.category_id == Task.category_id). \
+            join(Category, Category.id == Users_Categories.category_id)
+    else:
+        db_query = select(Task, Category.name). \
+            where(Task.archive == False).where(~Task.id.in_(shown_task)). \
+            join(Category, Category.id == Task.category_id)
+    result = db_session.execute(db_query)
+    return [[task, category_name] for task, category_name in result]
+
+
+def old_tap(telegram_id):
+    return old_get_user_active_tasks(telegram_id, [])
+
+
+def new_tap(telegram_id):
+    return user_service.get_user_active_tasks(telegram_id, 0, PAGINATION)[0]
+
+
+def measure(tap, telegram_id):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        try:
+            tap(telegram_id)
+        finally:
+            db_session.remove()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000]
+    create_fixture()
+    results = []
+    try:
+        users = 0
+        for size in sizes:
+            users = grow_users_categories(users, size)
+            results.append([size] + [measure(tap, telegram_id)
+                                     for telegram_id in (SUBSCRIBED_USER_ID, UNSUBSCRIBED_USER_ID)
+                                     for tap in (old_tap, new_tap)])
+    finally:
+        remove_fixture()
+    print(f'{TASKS} active tasks in {CATEGORIES} categories, median of {RUNS} runs, ms')
+    print(f'{"rows":>8} {"3 categories":>22} {"no categories":>22}')
+    print(f'{"":>8} {"old":>11}{"new":>11} {"old":>11}{"new":>11}')
+    for size, *timings in results:
+        print(f'{size:>8} ' + ' '.join(f'{old:>11.1f}{new:>11.1f}' for old, new in zip(timings[::2], timings[1::2])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Compares the flush time of DatabasePersistence with the PicklePersistence file
+it replaced, for the whole state and after a few users changed.
+
+Usage: python scripts/bench_persistence.py [users ...]
+
+Needs the database from .env with the migrations applied, preferably a scratch
+one. The rows written by the benchmark are removed at the end.
+"""
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete  # noqa: E402
+from telegram.ext import PicklePersistence  # noqa: E402
+
+from app.database import engine  # noqa: E402
+from app.models import BotPersistence  # noqa: E402
+from bot.persistence import USER_DATA, DatabasePersistence  # noqa: E402
+
+# Ids far above real telegram ids, so the benchmark rows are easy to remove
+FIRST_USER_ID = 10 ** 15
+CHANGED_USERS = 100
+
+
+def user_data(user_id, version):
+    return {'start_show_task': user_id % 100000 + version, 'has_categories': True}
+
+
+def measure(flush):
+    start = time.perf_counter()
+    flush()
+    return time.perf_counter() - start
+
+
+def bench_database(users):
+    persistence = DatabasePersistence()
+    persistence.get_user_data()
+    for user_id in users:
+        persistence.update_user_data(user_id, user_data(user_id, 0))
+    full = measure(persistence.flush)
+    for user_id in users[:CHANGED_USERS]:
+        persistence.update_user_data(user_id, user_data(user_id, 1))
+    changed = measure(persistence.flush)
+    return full, changed
+
+
+def bench_pickle(users, filename):
+    persistence = PicklePersistence(filename=filename, on_flush=True)
+    persistence.get_user_data()
+    for user_id in users:
+        persistence.update_user_data(user_id, user_data(user_id, 0))
+    full = measure(persistence.flush)
+    for user_id in users[:CHANGED_USERS]:
+        persistence.update_user_data(user_id, user_data(user_id, 1))
+    changed = measure(persistence.flush)
+    return full, changed
+
+
+def cleanup(users):
+    with engine.begin() as connection:
+        connection.execute(delete(BotPersistence.__table__).where(
+            BotPersistence.kind == USER_DATA,
+            BotPersistence.key.in_([str(user_id) for user_id in users])
+        ))
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000]
+    print(f'{"users":>8} {"backend":>8} {"full flush, s":>14} {f"{CHANGED_USERS} changed, s":>16}')
+    for size in sizes:
+        users = list(range(FIRST_USER_ID, FIRST_USER_ID + size))
+        try:
+            full, changed = bench_database(users)
+        finally:
+            cleanup(users)
+        print(f'{size:>8} {"table":>8} {full:>14.3f} {changed:>16.4f}')
+        with tempfile.TemporaryDirectory() as directory:
+            full, changed = bench_pickle(users, os.path.join(directory, 'bot_persistence'))
+        print(f'{size:>8} {"pickle":>8} {full:>14.3f} {changed:>16.4f}')
+
+
+if __name__ == '__main__':
+    main()
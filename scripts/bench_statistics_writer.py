@@ -0,0 +1,93 @@
+"""
+Compares the time log_command adds to a button press: the old synchronous
+add + commit of a Statistics row against StatisticsWriter.add. Presses are
+made from one thread, like the bot dispatcher, and from THREADS concurrent
+threads.
+
+Usage: python scripts/bench_statistics_writer.py [presses]
+
+Needs the database from .env with the migrations applied, preferably a scratch
+one. The rows written by the benchmark are removed at the end.
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete, func, select  # noqa: E402
+
+from app import config  # noqa: E402
+from app.database import db_session, engine  # noqa: E402
+from app.models import Statistics  # noqa: E402
+from bot.statistics_writer import StatisticsWriter  # noqa: E402
+
+# Ids far above real telegram ids, so the benchmark rows are easy to remove
+FIRST_USER_ID = 10 ** 15
+COMMAND = 'benchmark'
+THREADS = 4
+
+
+def press_sync(telegram_id):
+    start = time.perf_counter()
+    try:
+        db_session.add(Statistics(telegram_id=telegram_id, command=COMMAND))
+        db_session.commit()
+    finally:
+        db_session.remove()
+    return time.perf_counter() - start
+
+
+def make_press_writer(writer):
+    def press(telegram_id):
+        start = time.perf_counter()
+        writer.add(telegram_id, COMMAND)
+        return time.perf_counter() - start
+    return press
+
+
+def run(press, presses, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(press, range(FIRST_USER_ID, FIRST_USER_ID + presses)))
+    return time.perf_counter() - start, latencies
+
+
+def count_rows():
+    with engine.connect() as connection:
+        return connection.execute(
+            select(func.count()).select_from(Statistics).where(Statistics.telegram_id >= FIRST_USER_ID)
+        ).scalar()
+
+
+def cleanup():
+    with engine.begin() as connection:
+        connection.execute(delete(Statistics.__table__).where(Statistics.telegram_id >= FIRST_USER_ID))
+
+
+def main():
+    presses = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f'{"threads":>7} {"statistics":>10} {"avg, ms":>8} {"p95, ms":>8} {"presses/s":>10} {"saved in, s":>12}')
+    for threads in (1, THREADS):
+        for name in ('commit', 'writer'):
+            cleanup()
+            writer = StatisticsWriter(batch_size=config.STATISTICS_BATCH_SIZE,
+                                      flush_interval=config.STATISTICS_FLUSH_INTERVAL,
+                                      max_size=config.STATISTICS_BUFFER_SIZE)
+            press = press_sync if name == 'commit' else make_press_writer(writer)
+            try:
+                start = time.perf_counter()
+                elapsed, latencies = run(press, presses, threads)
+                writer.close()
+                saved_in = time.perf_counter() - start
+                assert count_rows() == presses, 'Not every press is saved'
+            finally:
+                cleanup()
+            print(f'{threads:>7} {name:>10} {sum(latencies) / presses * 1000:>8.3f} '
+                  f'{latencies[int(presses * 0.95)] * 1000:>8.3f} {presses / elapsed:>10.0f} {saved_in:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+Compares the tasks reconciliation of the full sync with the ORM diff of the
+old CreateTasks.post, for synthetic tasks: the first load, the same list
+again and a list with 1% changed and 1% missing tasks. Parsing of the request
+and notifications are left out, the time covers the reconciliation and the
+commit. app.webhooks is not imported because importing it starts the bot, the
+queries of write_tasks are made through TaskRepository.
+
+Usage: python scripts/bench_tasks_sync.py [tasks ...]
+
+Needs a scratch database from .env with the migrations applied: the sync
+archives every task missing from the list. The tasks and the category of
+the benchmark are removed at the end.
+"""
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete  # noqa: E402
+from sqlalchemy.dialects.postgresql import insert  # noqa: E402
+from sqlalchemy.orm import load_only  # noqa: E402
+
+from app import config  # noqa: E402
+from app.database import db_session, engine  # noqa: E402
+from app.models import Category, Task  # noqa: E402
+from app.request_models.task import TaskCreateRequest  # noqa: E402
+from core.repositories.task_repository import TaskRepository  # noqa: E402
+
+# Ids far above real ids, so the benchmark rows are easy to remove
+FIRST_TASK_ID = 10 ** 9
+CATEGORY_ID = 10 ** 9
+# The old diff scans lists inside list comprehensions, 100k tasks take hours
+OLD_MAX_TASKS = 20000
+
+task_repository = TaskRepository(db_session)
+
+
+def make_tasks(size, version=0):
+    return [TaskCreateRequest.parse_obj({
+        'id': FIRST_TASK_ID + index,
+        'title': f'Benchmark task {index} v{version}',
+        'name_organization': 'Benchmark',
+        'deadline': '31.12.2030',
+        'category_id': CATEGORY_ID,
+        'location': 'Online',
+        'link': f'https://procharity.ru/tasks/{index}/',
+        'description': f'Description {index}',
+    }) for index in range(size)]
+
+
+def scenarios(size):
+    tasks = make_tasks(size)
+    new_versions = make_tasks(size, version=1)
+    # Every 100th task is missing and the next one is changed
+    changed = [new_versions[index] if index % 100 == 1 else task
+               for index, task in enumerate(tasks) if index % 100 != 0]
+    return [('first load', tasks), ('unchanged', tasks), ('1% changed', changed)]
+
+
+def sync_old(tasks):
+    """The diff of the old CreateTasks.post."""
+    tasks_dict = {task.id: task for task in tasks}
+    tasks_db = Task.query.options(load_only('archive')).all()
+    task_id_json = [task.id for task in tasks]
+    task_id_db = [task.id for task in tasks_db]
+
+    task_id_db_not_archive = [task.id for task in tasks_db if task.archive is False]
+    task_for_archive = list(set(task_id_db_not_archive) - set(task_id_json))
+    for task in [task for task in tasks_db if task.id in task_for_archive]:
+        task.archive = True
+
+    task_id_db_archive = list(set(task_id_db) - set(task_id_db_not_archive))
+    task_for_unarchive = list(set(task_id_db_archive) & set(task_id_json))
+    for task in [task for task in tasks_db if task.id in task_for_unarchive]:
+        update_task_fields(task, tasks_dict[task.id])
+
+    task_for_adding_db = list(set(task_id_json) - set(task_id_db))
+    for task in [task for task in tasks if task.id in task_for_adding_db]:
+        db_session.add(Task(id=task.id, title=task.title, name_organization=task.name_organization,
+                            deadline=task.deadline, category_id=task.category_id, bonus=task.bonus,
+                            location=task.location, link=task.link, description=task.description,
+                            archive=False))
+
+    task_id_db_active = list(
+        set(task_id_json) - set(task_for_archive) - set(task_for_unarchive) - set(task_for_adding_db)
+    )
+    for task in [task for task in tasks_db if task.id in task_id_db_active]:
+        task_from_dict = tasks_dict[task.id]
+        if old_hash(task) != old_hash(task_from_dict):
+            update_task_fields(task, task_from_dict)
+    db_session.commit()
+
+
+def old_hash(task):
+    return hash(f'{task.title}{task.description}{task.deadline}')
+
+
+def update_task_fields(task, task_from_dict):
+    task.title = task_from_dict.title
+    task.name_organization = task_from_dict.name_organization
+    task.category_id = task_from_dict.category_id
+    task.bonus = task_from_dict.bonus
+    task.location = task_from_dict.location
+    task.link = task_from_dict.link
+    task.description = task_from_dict.description
+    task.deadline = task_from_dict.deadline
+    task.archive = False
+
+
+def sync_new(tasks):
+    """The reconciliation of sync_tasks and write_tasks."""
+    for i in range(0, len(tasks), config.TASKS_UPSERT_CHUNK_SIZE):
+        chunk = tasks[i:i + config.TASKS_UPSERT_CHUNK_SIZE]
+        known_tasks = task_repository.get_content_hashes([task.id for task in chunk])
+        active_pairs = {(task.id, task.content_hash) for task in known_tasks.values() if not task.archive}
+        changed = [task for task in chunk if (task.id, task.content_hash()) not in active_pairs]
+        if changed:
+            task_repository.upsert(changed)
+    task_repository.archive_missing([task.id for task in tasks])
+    db_session.commit()
+
+
+def measure(sync, tasks):
+    start = time.perf_counter()
+    try:
+        sync(tasks)
+    finally:
+        db_session.remove()
+    return time.perf_counter() - start
+
+
+def setup():
+    with engine.begin() as connection:
+        connection.execute(insert(Category.__table__).values(
+            id=CATEGORY_ID, name='Benchmark', archive=False
+        ).on_conflict_do_nothing())
+
+
+def cleanup(with_category=False):
+    with engine.begin() as connection:
+        connection.execute(delete(Task.__table__).where(Task.id >= FIRST_TASK_ID))
+        if with_category:
+            connection.execute(delete(Category.__table__).where(Category.id == CATEGORY_ID))
+
+
+def main():
+    sizes = [int(size) for size in sys.argv[1:]] or [10000, 100000]
+    print(f'{"tasks":>7} {"payload":>12} {"old, s":>8} {"new, s":>8}')
+    setup()
+    try:
+        for size in sizes:
+            payloads = scenarios(size)
+            results = {}
+            for name, sync in (('old', sync_old), ('new', sync_new)):
+                if name == 'old' and size > OLD_MAX_TASKS:
+                    continue
+                cleanup()
+                for payload, tasks in payloads:
+                    results[payload, name] = measure(sync, tasks)
+            for payload, _ in payloads:
+                old = results.get((payload, 'old'))
+                print(f'{size:>7} {payload:>12} {"-" if old is None else f"{old:.2f}":>8} '
+                      f'{results[payload, "new"]:>8.2f}')
+    finally:
+        cleanup(with_category=True)
+
+
+if __name__ == '__main__':
+    main()
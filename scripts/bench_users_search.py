@@ -0,0 +1,109 @@
+"""
+Times one page of the users search on a fixture of synthetic users, for the
+exact filters and for text searches, first page, newest users first.
+
+Usage: python scripts/bench_users_search.py [users]
+
+The query is built by UserSearchService, as in UsersSearch. The text search is only meaningful with the pg_trgm indexes of the
+users table; the script says when they are missing. Needs the database from
+.env with the migrations applied, preferably a scratch one. The rows of the
+fixture are removed at the end.
+"""
+import os
+import statistics
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from sqlalchemy import delete, text  # noqa: E402
+from sqlalchemy.dialects.postgresql import insert  # noqa: E402
+
+from app import config  # noqa: E402
+from app.database import db_session, engine  # noqa: E402
+from app.models import Category, User, Users_Categories  # noqa: E402
+from core.services.user_search_service import user_search_service  # noqa: E402
+
+# Ids far above real ids, so the benchmark rows are easy to remove
+FIRST_USER_ID = 10 ** 15
+CATEGORY_ID = 10 ** 9
+RUNS = 5
+CASES = (
+    ('no filters', {}),
+    ('has_mailing', {'has_mailing': True}),
+    ('banned', {'banned': True}),
+    ('category_id', {'category_id': CATEGORY_ID}),
+    ('q, one user', {'search': 'bench_user_123456'}),
+    ('q, many users', {'search': 'example'}),
+    ('q, no users', {'search': 'nobody'}),
+)
+
+
+def create_fixture(users):
+    with engine.begin() as connection:
+        connection.execute(insert(Category.__table__).values(
+            id=CATEGORY_ID, name='Benchmark', archive=False
+        ).on_conflict_do_nothing())
+        connection.execute(text(
+            'INSERT INTO users (telegram_id, username, email, first_name, has_mailing, banned, date_registration) '
+            'SELECT :first + n, \'bench_user_\' || n, \'bench_user_\' || n || \'@example.org\', '
+            '\'Name \' || n % 1000, n % 2 = 0, n % 50 = 0, now() - n * interval \'1 minute\' '
+            'FROM generate_series(0, :users - 1) AS n'
+        ), {'first': FIRST_USER_ID, 'users': users})
+        connection.execute(text(
+            'INSERT INTO users_categories (telegram_id, category_id) '
+            'SELECT :first + n, :category_id FROM generate_series(0, :users - 1, 10) AS n'
+        ), {'first': FIRST_USER_ID, 'users': users, 'category_id': CATEGORY_ID})
+        connection.execute(text('ANALYZE users'))
+        connection.execute(text('ANALYZE users_categories'))
+
+
+def remove_fixture():
+    with engine.begin() as connection:
+        connection.execute(delete(Users_Categories.__table__).where(Users_Categories.category_id == CATEGORY_ID))
+        connection.execute(delete(User.__table__).where(User.telegram_id >= FIRST_USER_ID))
+        connection.execute(delete(Category.__table__).where(Category.id == CATEGORY_ID))
+
+
+def has_trigram_indexes():
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT count(*) FROM pg_indexes WHERE tablename = 'users' AND indexname LIKE '%trgm'"
+        )).scalar() > 0
+
+
+def search(args):
+    """The first page of UsersSearch.get."""
+    query = user_search_service.get_query(**args)
+    return query.order_by(User.date_registration.desc(), User.telegram_id.desc()).limit(config.PAGE_LIMIT + 1).all()
+
+
+def measure(args):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        try:
+            found = len(search(args))
+        finally:
+            db_session.remove()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000, found
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    create_fixture(users)
+    try:
+        results = [(name, *measure(args)) for name, args in CASES]
+    finally:
+        remove_fixture()
+    print(f'{users} users, trigram indexes {"present" if has_trigram_indexes() else "MISSING"}, '
+          f'median of {RUNS} runs')
+    print(f'{"search":>14} {"ms":>8} {"rows":>5}')
+    for name, elapsed, found in results:
+        print(f'{name:>14} {elapsed:>8.1f} {found:>5}')
+
+
+if __name__ == '__main__':
+    main()